@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Entry point of python -m subtitleDownloader; see cli.py."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of video metadata (title and subtitle tracks).
+
+Pressing the hotkey again on the same video should not re-run the full
+yt-dlp extraction, so the small part of the info dict the plugin needs is
+kept in a JSON file keyed by a canonical form of the video URL.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a link came from
+_TRACKING_PARAMS = {
+    'si', 'feature', 'pp', 'ab_channel', 'fbclid', 'gclid', 'igshid',
+    'mc_cid', 'mc_eid', 'ref', 'ref_src', 't', 'embeds_referring_euri',
+}
+_YOUTUBE_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+# Path prefixes that carry the video id as the next path component
+_YOUTUBE_ID_PATHS = ('/shorts/', '/embed/', '/live/', '/v/')
+
+DEFAULT_TTL = 6 * 60 * 60 # Signed track URLs usually last a few hours
+DEFAULT_MAX_ENTRIES = 200
+
+
+def normalize_url(url):
+    """Returns a canonical form of a video URL for use as a cache key."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    host = parts.netloc.lower()
+    path = parts.path or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k not in _TRACKING_PARAMS and not k.startswith('utm_')]
+
+    video_id = None
+    if host in ('youtu.be', 'www.youtu.be'):
+        video_id = path.strip('/').split('/')[0]
+    elif host in _YOUTUBE_HOSTS:
+        if path == '/watch':
+            video_id = dict(query).get('v')
+        else:
+            for prefix in _YOUTUBE_ID_PATHS:
+                if path.startswith(prefix):
+                    video_id = path[len(prefix):].split('/')[0]
+                    break
+    if video_id:
+        # The playlist id is dropped too: with noplaylist (see downloader.py)
+        # yt-dlp extracts just the video either way
+        return urlunsplit(('https', 'www.youtube.com', '/watch', urlencode([('v', video_id)]), ''))
+
+    if path != '/':
+        path = path.rstrip('/')
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ''))
+
+
+def url_expiry(url):
+    """Returns the 'expire' timestamp of a signed URL (as in YouTube's track URLs), or None."""
+    expire = dict(parse_qsl(urlsplit(url or '').query)).get('expire')
+    return int(expire) if expire and expire.isdigit() else None
+
+
+def _track_expiry(subtitles):
+    """Returns the earliest 'expire' timestamp found in the track URLs, if any."""
+    earliest = None
+    for tracks in subtitles.values():
+        for track in tracks:
+            expire = url_expiry(track.get('url'))
+            if expire is not None and (earliest is None or expire < earliest):
+                earliest = expire
+    return earliest
+
+
+class MetadataCache(object):
+    """Thread-safe, size-bounded LRU cache of info dict subsets with a TTL."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = None # Loaded lazily on first use
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Returns the cached entry ({'title', 'subtitles', 'subtitle_sources', ...}) for a URL, or None.
+
+        subtitle_sources lists the kinds of tracks (see pipeline.TRACK_SOURCES)
+        the stored subtitles were chosen from, and subtitle_preferences the
+        languages translations were looked for.
+        """
+        key = normalize_url(url)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] <= time.time():
+                del entries[key]
+                self._save()
+                return None
+            entries.move_to_end(key)
+            info_dict = {
+                'title': entry['title'],
+                'subtitles': entry['subtitles'],
+                # Older entries only hold manual subtitles
+                'subtitle_sources': entry.get('sources', ['manual']),
+                'subtitle_preferences': entry.get('preferences', []),
+            }
+            # The video's identity, for the subtitle library (absent from older entries)
+            info_dict.update((k, entry[k]) for k in ('id', 'extractor_key', 'webpage_url') if entry.get(k))
+            return info_dict
+
+    def put(self, url, info_dict, subtitles, sources=('manual',), preferences=()):
+        """Stores the title and the given subtitle tracks, chosen from sources and preferences, for a URL."""
+        key = normalize_url(url)
+        expires = time.time() + self.ttl
+        url_expiry = _track_expiry(subtitles)
+        if url_expiry is not None:
+            expires = min(expires, url_expiry)
+        entry = {
+            'title': info_dict.get('title', 'video'),
+            'subtitles': {
+                lang: [{k: t[k] for k in ('ext', 'url', 'data', 'name', 'source', 'protocol') if t.get(k)} for t in tracks]
+                for lang, tracks in subtitles.items()
+            },
+            'sources': list(sources),
+            'preferences': list(preferences),
+            'expires': expires,
+        }
+        entry.update((k, info_dict[k]) for k in ('id', 'extractor_key', 'webpage_url') if info_dict.get(k))
+        with self._lock:
+            entries = self._load()
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save()
+
+    def discard(self, url):
+        """Drops the entry for a URL, e.g. after its track URLs stopped working."""
+        key = normalize_url(url)
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._save()
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self.path, 'r', encoding='utf-8') as cache_file:
+                    stored = json.load(cache_file)
+                now = time.time()
+                # Stored oldest first, so the LRU order survives a restart
+                for key, entry in stored:
+                    if entry.get('expires', 0) > now:
+                        self._entries[key] = entry
+            except (OSError, ValueError, TypeError) as e:
+                if not isinstance(e, FileNotFoundError):
+                    print(f"SubtitleDownloader: Ignoring unreadable metadata cache: {e}", file=sys.stderr)
+        return self._entries
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(list(self._entries.items()), cache_file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"SubtitleDownloader: Could not save metadata cache: {e}", file=sys.stderr)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Command-line batch downloads through the same pipeline as the NVDA hotkey.
+
+URLs are read one per line from files or standard input (blank lines and
+lines starting with # are skipped) and processed by a pool of threads that
+share one DownloaderService and one FetchScheduler, so the per-site limits
+hold across the whole batch. Playlists are expanded into their videos.
+Every output file is written atomically, and one JSON line per video is
+reported as it finishes; the shared modules print their diagnostics to
+standard error, so standard output carries only the report.
+
+Usage: python -m subtitleDownloader [urls.txt ...] [--output DIR] [--lang en,pt-BR]
+                                    [--jobs 4] [--report results.jsonl]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import MetadataCache
+from .downloader import DownloaderService
+from .library import SubtitleLibrary, video_record
+from .pipeline import (EXPORT_FORMATS, TRACK_SOURCES, Pipeline, entry_base_name, guess_language, has_channel_tabs, has_subtitles,
+                       playlist_entries, sanitize_filename, subtitle_source)
+from .scheduler import Deadline, DeadlineExceeded, FetchScheduler
+from .timing import JobTiming
+from .trackcache import TrackCache
+
+# Outcomes reported in the 'status' field of each JSON line
+OK = "ok"
+SKIPPED = "skipped"
+NO_SUBTITLES = "no_subtitles"
+PLAYLIST = "playlist"
+FAILED = "failed"
+
+
+def read_urls(paths):
+    """Yields the URLs listed in the given files ('-' for standard input)."""
+    for path in paths or ['-']:
+        lines = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+        try:
+            for line in lines:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+
+def choose_languages(available_subs, preferences):
+    """Returns the languages to fetch: the best match for each preference, or the top ranked one."""
+    if not preferences:
+        return list(available_subs)[:1]
+    chosen = []
+    for preference in preferences:
+        lang = guess_language(available_subs, [preference])
+        if lang and lang not in chosen:
+            chosen.append(lang)
+    return chosen
+
+
+class BatchRunner(object):
+    """Runs each URL through a Pipeline and reports one result per video."""
+
+    def __init__(self, pipeline, output, preferences=(), exports=(), timeout=300, overwrite=False):
+        self.pipeline = pipeline
+        self.output = output
+        self.preferences = list(preferences)
+        self.exports = tuple(exports)
+        self.timeout = timeout
+        self.overwrite = overwrite
+
+    def process(self, url, folder=None, base_name=None):
+        """Downloads the subtitles of one URL. Returns (result, playlist entries to queue).
+
+        folder and base_name are given for playlist videos, which are saved
+        in a folder named after their playlist.
+        """
+        timing = JobTiming(url)
+        result = {'url': url, 'status': FAILED, 'files': []}
+        entries = []
+        try:
+            info_dict = self.pipeline.extract_info(url, timing, Deadline(self.timeout), self.preferences)
+            if info_dict.get('_type') == 'playlist':
+                entries = self._playlist_entries(info_dict)
+                if not entries and has_channel_tabs(info_dict):
+                    result['error'] = "The channel page only lists its tabs; pass the URL of its Videos tab"
+                    return result, entries
+                result.update(status=PLAYLIST, title=info_dict.get('title'), entries=len(entries))
+                return result, entries
+            result.update(title=info_dict.get('title'), id=info_dict.get('id'))
+            if info_dict.get('is_live'):
+                result['error'] = "Live streams are not captured from the command line"
+                return result, entries
+            available_subs = self.pipeline.available_subs(url, info_dict, self.preferences)
+            languages = choose_languages(available_subs, self.preferences)
+            if not has_subtitles(info_dict) or not languages:
+                result['status'] = NO_SUBTITLES
+                return result, entries
+
+            folder = folder or self.output
+            base_name = base_name or sanitize_filename(info_dict.get('title') or info_dict.get('id') or 'video')
+            os.makedirs(folder, exist_ok=True)
+            # Languages are fetched in turn: the pool already runs several videos at once
+            deadline = Deadline(self.timeout)
+            video = video_record(url, info_dict)
+            fetched = 0
+            for lang in languages:
+                path = os.path.join(folder, f"{base_name}.{lang}.txt")
+                if not self.overwrite and os.path.exists(path):
+                    result['files'].append({'lang': lang, 'path': path, 'skipped': True})
+                    continue
+                tracks = available_subs[lang]
+                path, converted = self.pipeline.save_language(lang, tracks, base_name, folder, timing, video, self.exports, deadline)
+                result['files'].append({'lang': lang, 'source': subtitle_source(tracks), 'path': path, 'converted': converted})
+                fetched += 1
+            result['status'] = OK if fetched else SKIPPED
+        except DeadlineExceeded as e:
+            result['error'] = f"Timed out: {e}"
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+            # The cached track URLs may be the ones that stopped working
+            self.pipeline.forget(url)
+        finally:
+            timing.finish()
+            result['seconds'] = round(timing.duration, 3)
+            result['phases'] = {name: round(seconds, 3) for name, (seconds, _bytes, _count) in timing.totals().items()}
+        return result, entries
+
+    def _playlist_entries(self, playlist_info):
+        """Returns (url, folder, base_name) for the videos of a flat playlist, as the plugin names them."""
+        folder = os.path.join(self.output, sanitize_filename(playlist_info.get('title') or 'playlist'))
+        return [(entry.get('webpage_url') or entry['url'], folder, entry_base_name(index, entry))
+                for index, entry in enumerate(playlist_entries(playlist_info), 1)]
+
+    def run(self, urls, jobs, report):
+        """Processes urls with up to jobs threads, writing a JSON line per result to report.
+
+        Returns the number of videos that failed.
+        """
+        failed = 0
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="SubtitleDownloaderBatch") as pool:
+            pending = set()
+            urls = iter(urls)
+            while True:
+                # Keep the pool fed without reading a long URL list all at once
+                for url in urls:
+                    pending.add(pool.submit(self.process, url))
+                    if len(pending) >= jobs * 2:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, entries = future.result()
+                    for entry_url, folder, base_name in entries:
+                        pending.add(pool.submit(self.process, entry_url, folder, base_name))
+                    failed += result['status'] == FAILED
+                    report.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    report.flush()
+        return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m subtitleDownloader", description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="*", metavar="FILE", help="files listing one URL per line; standard input if none or '-'")
+    parser.add_argument("--output", default=".", help="folder the subtitles are saved to (default: current folder)")
+    parser.add_argument("--lang", default="", help="comma separated language preferences, e.g. en,pt-BR; each one fetches its best match (default: the top ranked language)")
+    parser.add_argument("--sources", default=",".join(TRACK_SOURCES), help="comma separated kinds of tracks offered, best first (default: %(default)s)")
+    parser.add_argument("--export", action="append", choices=sorted(EXPORT_FORMATS), default=[], help="also write a timed copy in this format; may be repeated")
+    parser.add_argument("--jobs", type=int, default=4, help="videos processed at the same time (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second to one site (default: %(default)s)")
+    parser.add_argument("--timeout", type=int, default=300, help="seconds a video may spend waiting for and retrying requests (default: %(default)s)")
+    parser.add_argument("--cache-dir", help="folder for the metadata, subtitle and yt-dlp caches (default: no caching)")
+    parser.add_argument("--library", help="SQLite subtitle library to record downloads in, e.g. the add-on's library.sqlite3")
+    parser.add_argument("--overwrite", action="store_true", help="download again subtitles whose TXT file already exists")
+    parser.add_argument("--report", help="write the JSON lines report to this file instead of standard output")
+    args = parser.parse_args(argv)
+
+    sources = tuple(source.strip() for source in args.sources.split(",") if source.strip())
+    unknown = [source for source in sources if source not in TRACK_SOURCES]
+    if unknown or not sources:
+        parser.error(f"--sources must list some of {', '.join(TRACK_SOURCES)}")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    try:
+        import yt_dlp
+    except ImportError:
+        print("yt-dlp is not installed.", file=sys.stderr)
+        return 2
+
+    library = SubtitleLibrary(args.library) if args.library else None
+    scheduler = FetchScheduler(rate=args.rate)
+    cache_dir = args.cache_dir
+    pipeline = Pipeline(
+        lambda: DownloaderService(yt_dlp, cache_dir=os.path.join(cache_dir, "yt-dlp") if cache_dir else None, scheduler=scheduler),
+        MetadataCache(os.path.join(cache_dir, "metadata.json")) if cache_dir else None,
+        library,
+        TrackCache(os.path.join(cache_dir, "tracks")) if cache_dir else None,
+    )
+    pipeline.sources = sources
+    runner = BatchRunner(pipeline, args.output, [lang.strip() for lang in args.lang.split(",") if lang.strip()],
+                         args.export, args.timeout, args.overwrite)
+
+    start = time.perf_counter()
+    report = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        failed = runner.run(read_urls(args.inputs), args.jobs, report)
+    finally:
+        if report is not sys.stdout:
+            report.close()
+        pipeline.close()
+    print(f"Finished in {time.perf_counter() - start:.1f} s, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""Streaming conversion of subtitles to plain text.
+
+WebVTT is read from iterables of lines; YouTube's srv1/srv2/srv3 XML and
+TTML are read incrementally with iterparse straight from the fetched bytes.
+Everything yields results one at a time, so a subtitle file never has to be
+held in memory in parsed form. The module has no NVDA dependencies.
+"""
+
+import html
+import io
+import itertools
+import re
+
+_TAG_RE = re.compile(r'<[^>]*>') # Voice, class, ruby and karaoke timestamp tags
+_SPACE_RE = re.compile(r'\s+')
+_TIMESTAMP_RE = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})')
+# TTML clock times ('00:00:01.500', '00:00:01:12' with frames) and offsets ('1.5s', '1500ms', '90t')
+_TTML_CLOCK_RE = re.compile(r'(\d+):(\d{2}):(\d{2})(?:\.(\d+)|:(\d+))?$')
+_TTML_OFFSET_RE = re.compile(r'(\d+(?:\.\d+)?)(h|m|s|ms|f|t)$')
+_TTML_UNIT_MS = {'h': 3600000, 'm': 60000, 's': 1000, 'ms': 1}
+
+# Formats this module can convert, cheapest to transfer first. YouTube serves
+# the same captions in all of them; srv1 has no per-word timing or styling
+# and is typically several times smaller than the karaoke-tagged VTT.
+SUPPORTED_FORMATS = ('srv1', 'srv2', 'srv3', 'ttml', 'vtt')
+
+
+def parse_timestamp(value):
+    """Converts a VTT timestamp ('01:02:03.456' or '02:03.456') to milliseconds."""
+    match = _TIMESTAMP_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    hours, minutes, seconds, fraction = match.groups()
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, '0'))
+
+
+def clean_text(text):
+    """Removes markup tags and entities from a line of caption text."""
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
+    if '&' in text:
+        text = html.unescape(text).replace('\xa0', ' ')
+    text = text.strip()
+    if '  ' in text or '\t' in text:
+        text = _SPACE_RE.sub(' ', text)
+    return text
+
+
+def _iter_cue_blocks(lines):
+    """Yields (timing_line, raw_text_lines) for every cue block in a WebVTT stream.
+
+    The header, NOTE, STYLE and REGION blocks have no timing line and are
+    skipped, as are cue identifiers.
+    """
+    block = []
+    # The trailing blank line flushes a last cue that has none after it
+    for line in itertools.chain(lines, ('',)):
+        if line.strip():
+            block.append(line.rstrip('\r\n'))
+            continue
+        if not block:
+            continue
+        if '-->' in block[0]:
+            yield block[0], block[1:]
+        elif len(block) > 1 and '-->' in block[1]:
+            yield block[1], block[2:] # The first line is a cue identifier
+        block = []
+
+
+def iter_vtt_cues(lines):
+    """Yields (start_ms, end_ms, text_lines) for every cue in a WebVTT stream.
+
+    Cue settings after the timing are ignored and text lines are already
+    cleaned; cues without text are skipped.
+    """
+    for timing, raw_lines in _iter_cue_blocks(lines):
+        start, _sep, end = timing.partition('-->')
+        try:
+            start_ms = parse_timestamp(start)
+            end_ms = parse_timestamp(end.split(None, 1)[0]) # Drop cue settings
+        except (ValueError, IndexError):
+            continue
+        text_lines = [text for text in map(clean_text, raw_lines) if text]
+        if text_lines:
+            yield start_ms, end_ms, text_lines
+
+
+def iter_text(cues, dedupe=True):
+    """Yields the caption text lines of a cue stream.
+
+    With dedupe, lines carried over from the previous cue are dropped. Auto
+    generated captions roll: each cue repeats the last line of the one before
+    it, which would otherwise write every sentence two or three times.
+    """
+    previous = ()
+    last = None
+    for _start, _end, text_lines in cues:
+        for text in text_lines:
+            if dedupe and (text == last or text in previous):
+                continue
+            last = text
+            yield text
+        previous = text_lines
+
+
+def dedupe_cues(cues):
+    """Yields (start_ms, end_ms, text_lines) with lines carried over from the previous cue removed.
+
+    The timed counterpart of iter_text's dedupe; cues left without text are
+    skipped.
+    """
+    previous = ()
+    for start_ms, end_ms, text_lines in cues:
+        new_lines = [text for text in text_lines if text not in previous]
+        previous = text_lines
+        if new_lines:
+            yield start_ms, end_ms, new_lines
+
+
+def vtt_to_text(lines, dedupe=True):
+    """Yields the plain text lines of a WebVTT stream."""
+    # Timings are not needed for plain text, so they are not parsed
+    cues = ((None, None, [text for text in map(clean_text, raw_lines) if text])
+            for _timing, raw_lines in _iter_cue_blocks(lines))
+    return iter_text(cues, dedupe=dedupe)
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _element_text(elem):
+    """Returns the text of an element with <br/> children as line breaks."""
+    parts = [elem.text or '']
+    for child in elem:
+        if _local_name(child.tag) == 'br':
+            parts.append('\n')
+        else:
+            parts.append(''.join(child.itertext()))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def _parse_ttml_time(value, tick_rate, frame_rate):
+    """Converts a TTML time expression to milliseconds."""
+    value = value.strip()
+    match = _TTML_CLOCK_RE.match(value)
+    if match:
+        hours, minutes, seconds, fraction, frames = match.groups()
+        ms = ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000
+        if fraction:
+            ms += int(fraction[:3].ljust(3, '0'))
+        elif frames:
+            ms += int(int(frames) * 1000 / frame_rate)
+        return ms
+    match = _TTML_OFFSET_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid TTML time: {value!r}")
+    number, unit = float(match.group(1)), match.group(2)
+    if unit == 't':
+        return int(number * 1000 / tick_rate)
+    if unit == 'f':
+        return int(number * 1000 / frame_rate)
+    return int(number * _TTML_UNIT_MS[unit])
+
+
+def _xml_cue_times(attrib, tick_rate, frame_rate):
+    """Returns (start_ms, end_ms) from the timing attributes of any supported XML format."""
+    if 'start' in attrib: # srv1: seconds
+        start = int(float(attrib['start']) * 1000)
+        return start, start + int(float(attrib.get('dur', 0)) * 1000)
+    if 't' in attrib: # srv2/srv3: milliseconds
+        start = int(attrib['t'])
+        return start, start + int(attrib.get('d', 0))
+    if 'begin' in attrib: # TTML
+        start = _parse_ttml_time(attrib['begin'], tick_rate, frame_rate)
+        if 'end' in attrib:
+            return start, _parse_ttml_time(attrib['end'], tick_rate, frame_rate)
+        return start, start + _parse_ttml_time(attrib.get('dur', '0s'), tick_rate, frame_rate)
+    return None
+
+
+def iter_xml_cues(source):
+    """Yields (start_ms, end_ms, text_lines) from srv1, srv2, srv3 or TTML.
+
+    source is a binary file object. Cue elements (<text> in srv1/srv2, <p> in
+    srv3/TTML) are dropped from the tree as soon as they are read, so memory
+    stays flat however long the track is.
+    """
+    # Imported here: only XML formats need it, and the plugin imports this module at startup
+    from xml.etree import ElementTree
+    tick_rate = 1.0
+    frame_rate = 30.0
+    parents = []
+    for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+        name = _local_name(elem.tag)
+        if event == 'start':
+            parents.append(elem)
+            if name == 'tt':
+                for key, value in elem.attrib.items():
+                    key = _local_name(key)
+                    if key == 'tickRate':
+                        tick_rate = float(value)
+                    elif key == 'frameRate':
+                        frame_rate = float(value)
+            continue
+        parents.pop()
+        if name not in ('text', 'p'):
+            continue
+        try:
+            times = _xml_cue_times(elem.attrib, tick_rate, frame_rate)
+        except ValueError:
+            times = None
+        if times:
+            # srv1 double-escapes entities, clean_text takes care of the second level
+            text_lines = [text for text in map(clean_text, _element_text(elem).split('\n')) if text]
+            if text_lines:
+                yield times[0], times[1], text_lines
+        # Detach the finished cue, or the tree would keep every one of them
+        if parents:
+            parents[-1].remove(elem)
+
+
+def iter_cues(data, ext):
+    """Yields (start_ms, end_ms, text_lines) from the raw bytes of a track."""
+    if ext == 'vtt':
+        return iter_vtt_cues(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig'))
+    if ext in SUPPORTED_FORMATS:
+        return iter_xml_cues(io.BytesIO(data))
+    raise ValueError(f"Unsupported subtitle format: {ext}")
+
+
+def to_text(data, ext, dedupe=True):
+    """Yields the plain text lines of a track given its raw bytes and format."""
+    if ext == 'vtt':
+        return vtt_to_text(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig'), dedupe=dedupe)
+    return iter_text(iter_cues(data, ext), dedupe=dedupe)
+
+
+def write_text(text_lines, out_file):
+    """Writes text lines to a file object, one per line. Returns the line count."""
+    count = 0
+    for text in text_lines:
+        out_file.write(text)
+        out_file.write('\n')
+        count += 1
+    return count
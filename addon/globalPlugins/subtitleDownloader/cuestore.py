@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Compact, timestamp-preserving storage of the cues of one transcript.
+
+The TXT output drops all timing. A CueStore keeps it in a few flat arrays
+instead of one tuple per cue: start and end times as integer milliseconds,
+and the text of every cue in a single string sliced by offsets. A multi-hour
+transcript then takes a few hundred KB and loads from the library at once;
+"what was said at 12:34" is a binary search over the start times. The module
+has no NVDA dependencies.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+
+_POSITION_RE = re.compile(r'^\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})\s*$')
+
+
+def parse_position(text):
+    """Converts '12:34', '1:02:03' or a number of seconds to milliseconds. Returns None if invalid."""
+    text = text.strip()
+    if text.isdigit():
+        return int(text) * 1000
+    match = _POSITION_RE.match(text)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    # Minutes alone may run past an hour ('90:00'), but not below hours
+    if int(seconds) > 59 or (hours is not None and int(minutes) > 59):
+        return None
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000
+
+
+def _srt_time(ms):
+    return "%02d:%02d:%02d,%03d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+
+def _clock_time(ms):
+    return "%02d:%02d:%02d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60)
+
+
+class CueStore(object):
+    """Array-backed cues, in start time order.
+
+    Iterating yields (start_ms, end_ms, text_lines) like the converter's cue
+    streams, so a store can be passed wherever cues are expected.
+    """
+
+    def __init__(self):
+        self.starts = array('i')
+        self.ends = array('i')
+        self._offsets = array('i', [0])
+        self._parts = [] # Text appended since the buffer was last joined
+        self._text = ''
+
+    @classmethod
+    def from_cues(cls, cues):
+        """Builds a store from (start_ms, end_ms, text_lines), e.g. converter.dedupe_cues()."""
+        store = cls()
+        for start_ms, end_ms, text_lines in cues:
+            store.append(start_ms, end_ms, '\n'.join(text_lines))
+        store._buffer()
+        return store
+
+    def append(self, start_ms, end_ms, text):
+        """Adds a cue; cues must come in start time order for at() to work."""
+        self.starts.append(start_ms or 0)
+        self.ends.append(end_ms or 0)
+        self._parts.append(text)
+        self._offsets.append(self._offsets[-1] + len(text))
+
+    def _buffer(self):
+        if self._parts:
+            self._text += ''.join(self._parts)
+            self._parts = []
+        return self._text
+
+    def __len__(self):
+        return len(self.starts)
+
+    def text(self, index):
+        return self._buffer()[self._offsets[index]:self._offsets[index + 1]]
+
+    def __getitem__(self, index):
+        """Returns (start_ms, end_ms, text) of a cue."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.starts[index], self.ends[index], self.text(index)
+
+    def __iter__(self):
+        buffer = self._buffer()
+        offsets = self._offsets
+        for index in range(len(self.starts)):
+            yield self.starts[index], self.ends[index], buffer[offsets[index]:offsets[index + 1]].split('\n')
+
+    def index_at(self, ms):
+        """Returns the index of the cue being shown at ms, or the last one before it; None before the first."""
+        index = bisect_right(self.starts, ms) - 1
+        return index if index >= 0 else None
+
+    def at(self, ms):
+        """Returns (start_ms, end_ms, text) of what was said at ms, or None."""
+        index = self.index_at(ms)
+        return None if index is None else self[index]
+
+    def write_srt(self, out_file):
+        """Writes the cues as SubRip. Returns the cue count."""
+        for number, (start_ms, end_ms, text_lines) in enumerate(self, 1):
+            out_file.write(f"{number}\n{_srt_time(start_ms)} --> {_srt_time(end_ms)}\n")
+            out_file.write('\n'.join(text_lines))
+            out_file.write('\n\n')
+        return len(self)
+
+    def write_timestamped_text(self, out_file):
+        """Writes one '[hh:mm:ss] text' line per cue. Returns the cue count."""
+        for start_ms, _end_ms, text_lines in self:
+            out_file.write(f"[{_clock_time(start_ms)}] {' '.join(text_lines)}\n")
+        return len(self)
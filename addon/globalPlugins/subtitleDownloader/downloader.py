@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Long-lived yt-dlp instances shared by all downloads of a session.
+
+Creating a YoutubeDL per request throws away its HTTP connection pool,
+cookie jar and the extractors' in-memory caches (player JS, signature
+functions). The service below keeps a small pool of instances alive
+instead. A YoutubeDL object is not safe to use from two threads at once,
+so each call checks one out exclusively and returns it afterwards.
+
+With a scheduler.FetchScheduler, every network call is also subject to its
+per-host limits and retried on rate limiting and transient errors.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from .scheduler import parse_retry_after
+
+# HTTP statuses worth retrying: rate limited, or a server having a bad moment
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class DownloaderService(object):
+    """Thread-safe access to reusable YoutubeDL instances."""
+
+    def __init__(self, yt_dlp, cache_dir=None, scheduler=None):
+        self._yt_dlp = yt_dlp
+        self._options = {
+            'skip_download': True,      # Don't download the video itself
+            'extract_flat': 'in_playlist', # Don't resolve playlist entries
+            # A video watched inside a playlist or Mix (watch?v=X&list=Y) is
+            # that video; only playlist and channel URLs start batch mode
+            'noplaylist': True,
+            'quiet': True,
+            'noprogress': True,
+            # Errors must surface to be retried; flat playlists resolve no entries anyway
+            'ignoreerrors': False,
+            'logtostderr': False, # Avoid polluting NVDA speech/braille
+            'verbose': False,
+        }
+        if cache_dir:
+            # yt-dlp also stores signature functions on disk, across sessions
+            self._options['cachedir'] = cache_dir
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.scheduler = scheduler
+
+    def retry_after(self, error):
+        """Classifies an error for the scheduler: seconds to wait before retrying, or None."""
+        exceptions = self._yt_dlp.networking.exceptions
+        # yt-dlp wraps the network error in ExtractorError and DownloadError
+        seen = 0
+        while error is not None and seen < 8:
+            if isinstance(error, exceptions.HTTPError):
+                if error.status not in _RETRY_STATUSES:
+                    return None
+                return parse_retry_after(error.response.headers.get('Retry-After'))
+            if isinstance(error, exceptions.TransportError):
+                return 0
+            exc_info = getattr(error, 'exc_info', None)
+            error = getattr(error, 'cause', None) or (exc_info[1] if exc_info else None) or error.__cause__
+            seen += 1
+        return None
+
+    def _schedule(self, url, func, deadline):
+        if self.scheduler is None:
+            return func()
+        return self.scheduler.call(url, func, self.retry_after, deadline)
+
+    @contextmanager
+    def _instance(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Downloader service is closed")
+            # Most recently used first, its connections are the likeliest to be alive
+            ydl = self._idle.pop() if self._idle else None
+        if ydl is None:
+            ydl = self._yt_dlp.YoutubeDL(dict(self._options))
+        try:
+            yield ydl
+        finally:
+            with self._lock:
+                if self._closed:
+                    ydl.close()
+                else:
+                    self._idle.append(ydl)
+
+    def extract_info(self, url, deadline=None):
+        """Returns the info dict for a URL; playlist entries are left unresolved."""
+        def extract():
+            with self._instance() as ydl:
+                return ydl.extract_info(url, download=False) or {}
+        # The requests yt-dlp makes inside are scheduled as one call
+        return self._schedule(url, extract, deadline)
+
+    def fetch(self, url, headers=None, deadline=None):
+        """Returns the body of a URL over the pooled connections."""
+        def fetch():
+            request = self._yt_dlp.networking.Request(url, headers=headers or {})
+            with self._instance() as ydl:
+                with ydl.urlopen(request) as response:
+                    return response.read()
+        return self._schedule(url, fetch, deadline)
+
+    def fetch_validated(self, url, headers=None, etag=None, last_modified=None, deadline=None):
+        """Conditional GET. Returns (body, etag, last_modified); body is None if not modified."""
+        headers = dict(headers or {})
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        def fetch():
+            request = self._yt_dlp.networking.Request(url, headers=headers)
+            with self._instance() as ydl:
+                try:
+                    with ydl.urlopen(request) as response:
+                        return response.read(), response.headers.get('ETag'), response.headers.get('Last-Modified')
+                except self._yt_dlp.networking.exceptions.HTTPError as e:
+                    if e.status == 304:
+                        return None, etag, last_modified
+                    raise
+        return self._schedule(url, fetch, deadline)
+
+    def close(self):
+        """Closes idle instances now; busy ones are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for ydl in idle:
+            ydl.close()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Download job queue served by a bounded pool of worker threads.
+
+Jobs are keyed by normalized URL, so pressing the hotkey twice on the same
+video while it is still queued or running does not start a second download.
+"""
+
+import itertools
+import sys
+import threading
+from collections import deque
+
+from .cache import normalize_url
+from .scheduler import Deadline
+from .timing import JobTiming
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised from within a job when it notices it has been cancelled."""
+
+
+class Job(object):
+    """A single download request."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, url):
+        self.id = next(self._ids)
+        self.url = url
+        self.key = normalize_url(url)
+        self.state = QUEUED
+        self.title = None # Filled in by the runner once known
+        self.timing = JobTiming(url)
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def wait_cancelled(self, timeout):
+        """Sleeps up to timeout seconds; returns True as soon as the job is cancelled."""
+        return self._cancel_event.wait(timeout)
+
+    def deadline(self, seconds):
+        """Returns a scheduler.Deadline seconds from now whose waits end when the job is cancelled."""
+        return Deadline(seconds, self._cancel_event)
+
+    def check_cancelled(self):
+        """Raises JobCancelled if the job was cancelled; call between phases."""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobQueue(object):
+    """FIFO of jobs run by up to max_workers threads started on demand.
+
+    run_job is called with the Job on a worker thread; it returns normally on
+    success and may raise JobCancelled. Any other exception marks the job
+    failed; reporting errors to the user is up to run_job.
+    """
+
+    def __init__(self, run_job, max_workers=2):
+        self._run_job = run_job
+        self.max_workers = max_workers
+        self._pending = deque()
+        self._running = []
+        self._workers = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+
+    def submit(self, url):
+        """Queues a URL. Returns (job, is_new); an in-flight job for the same URL is reused."""
+        key = normalize_url(url)
+        with self._condition:
+            for job in itertools.chain(self._running, self._pending):
+                if job.key == key and not job.cancelled:
+                    return job, False
+            job = Job(url)
+            self._pending.append(job)
+            self._workers = [w for w in self._workers if w.is_alive()]
+            if len(self._workers) < self.max_workers and len(self._workers) < len(self._pending) + len(self._running):
+                worker = threading.Thread(target=self._work, name="SubtitleDownloaderWorker", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify()
+            return job, True
+
+    def position(self, job):
+        """Returns 0 for a running job, 1.. for queued ones and None otherwise."""
+        with self._condition:
+            if job in self._running:
+                return 0
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return None
+
+    def snapshot(self):
+        """Returns (running, queued) job lists."""
+        with self._condition:
+            return list(self._running), list(self._pending)
+
+    def cancel_all(self):
+        """Cancels queued and running jobs. Returns the number of jobs affected."""
+        with self._condition:
+            jobs = list(self._running) + list(self._pending)
+            for job in self._pending:
+                job.state = CANCELLED
+            self._pending.clear()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def shutdown(self):
+        self.cancel_all()
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._shutdown:
+                    # Idle workers exit after a while and are restarted on demand
+                    if not self._condition.wait(timeout=30) and not self._pending:
+                        self._workers.remove(threading.current_thread())
+                        return
+                if self._shutdown:
+                    return
+                job = self._pending.popleft()
+                job.state = RUNNING
+                self._running.append(job)
+            try:
+                self._run_job(job)
+                job.state = CANCELLED if job.cancelled else DONE
+            except JobCancelled:
+                job.state = CANCELLED
+            except Exception as e:
+                job.state = FAILED
+                print(f"SubtitleDownloader: Job for {job.url} failed: {e}", file=sys.stderr)
+            finally:
+                with self._condition:
+                    self._running.remove(job)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Local library of downloaded transcripts with a full-text index.
+
+Every converted subtitle is recorded in a SQLite database next to the
+add-on's other files: one row per video and language, one row per cue with
+its start and end time, and an FTS5 index over the cue text. Searching
+thousands of transcripts is then a single indexed query, and finding what
+was already downloaded for a video is a lookup by its id rather than a
+directory scan. The module has no NVDA dependencies.
+"""
+
+import os
+import threading
+import time
+
+from .cuestore import CueStore
+
+DEFAULT_SEARCH_LIMIT = 50
+# Cues are inserted in batches so a multi-hour transcript is never held as one list
+_INSERT_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    extractor TEXT NOT NULL DEFAULT '',
+    video_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    path TEXT,
+    downloaded REAL,
+    UNIQUE (extractor, video_id, lang)
+);
+CREATE INDEX IF NOT EXISTS transcripts_video ON transcripts (video_id);
+CREATE TABLE IF NOT EXISTS cues (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL REFERENCES transcripts (id) ON DELETE CASCADE,
+    start_ms INTEGER,
+    end_ms INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cues_transcript ON cues (transcript_id, start_ms);
+CREATE VIRTUAL TABLE IF NOT EXISTS cue_index USING fts5 (
+    text, content='cues', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS cues_insert AFTER INSERT ON cues BEGIN
+    INSERT INTO cue_index (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS cues_delete AFTER DELETE ON cues BEGIN
+    INSERT INTO cue_index (cue_index, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def video_record(url, info_dict):
+    """Returns the fields the library keeps about a video, from a (possibly cached) info dict."""
+    return {
+        'id': info_dict.get('id') or url,
+        'extractor': info_dict.get('extractor_key') or '',
+        'title': info_dict.get('title'),
+        'url': info_dict.get('webpage_url') or url,
+    }
+
+
+def format_position(ms):
+    """Formats milliseconds as 'm:ss' or 'h:mm:ss' for speech and lists."""
+    seconds = (ms or 0) // 1000
+    if seconds >= 3600:
+        return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "%d:%02d" % (seconds // 60, seconds % 60)
+
+
+def _match_expression(query):
+    """Turns free text into an FTS5 query matching all of its words."""
+    words = query.split()
+    if not words:
+        return None
+    # Quoted, so punctuation and FTS5 operators typed by the user are taken literally
+    terms = ['"%s"' % word.replace('"', '""') for word in words]
+    # The last word may still be being typed
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SubtitleLibrary(object):
+    """Thread-safe access to the transcript database, opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            # Imported here: the plugin creates the library at NVDA startup
+            import sqlite3
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def add(self, video, lang, path, cues):
+        """Records a transcript and indexes its cues, replacing an earlier download of it.
+
+        video comes from video_record(); cues yields (start_ms, end_ms,
+        text_lines). Returns the number of cues stored.
+        """
+        count = 0
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "DELETE FROM transcripts WHERE extractor = ? AND video_id = ? AND lang = ?",
+                    (video['extractor'], video['id'], lang))
+                transcript_id = connection.execute(
+                    "INSERT INTO transcripts (extractor, video_id, lang, title, url, path, downloaded) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (video['extractor'], video['id'], lang, video.get('title'), video.get('url'), path, time.time())).lastrowid
+                batch = []
+                for start_ms, end_ms, text_lines in cues:
+                    batch.append((transcript_id, start_ms, end_ms, ' '.join(text_lines)))
+                    if len(batch) >= _INSERT_BATCH:
+                        connection.executemany("INSERT INTO cues (transcript_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)", batch)
+                        count += len(batch)
+                        batch = []
+                if batch:
+                    connection.executemany("INSERT INTO cues (transcript_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)", batch)
+                    count += len(batch)
+        return count
+
+    def lookup(self, video_ids, extractor=None):
+        """Returns {video_id: {lang: path}} for the recorded transcripts of the given videos."""
+        video_ids = list(video_ids)
+        found = {}
+        if not video_ids:
+            return found
+        with self._lock:
+            connection = self._connect()
+            # Chunked to stay under SQLite's limit on query parameters
+            for offset in range(0, len(video_ids), 500):
+                chunk = video_ids[offset:offset + 500]
+                sql = "SELECT video_id, lang, path FROM transcripts WHERE video_id IN (%s)" % ", ".join("?" * len(chunk))
+                params = list(chunk)
+                if extractor is not None:
+                    sql += " AND extractor = ?"
+                    params.append(extractor)
+                for video_id, lang, path in connection.execute(sql, params):
+                    found.setdefault(video_id, {})[lang] = path
+        return found
+
+    def load_cues(self, video_id, lang, extractor=None):
+        """Returns the cues of a recorded transcript as a cuestore.CueStore, or None."""
+        sql = "SELECT id FROM transcripts WHERE video_id = ? AND lang = ?"
+        params = [video_id, lang]
+        if extractor is not None:
+            sql += " AND extractor = ?"
+            params.append(extractor)
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(sql + " ORDER BY downloaded DESC LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            store = CueStore()
+            for start_ms, end_ms, text in connection.execute(
+                    "SELECT start_ms, end_ms, text FROM cues WHERE transcript_id = ? ORDER BY start_ms", row):
+                store.append(start_ms, end_ms, text)
+        return store
+
+    def recent_languages(self, limit=5):
+        """Returns the languages of the library, most recently downloaded first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT lang FROM transcripts GROUP BY lang ORDER BY MAX(downloaded) DESC LIMIT ?", (limit,)).fetchall()
+        return [lang for lang, in rows]
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Returns the cues containing every word of query as dicts, newest downloads first.
+
+        Ranking by relevance would score every match before the LIMIT applies,
+        which takes hundreds of milliseconds for common words in a large
+        library; walking the index backwards by rowid stops at the limit. Each
+        result has video_id, title, lang, url, path, start_ms and a short
+        snippet of the cue text.
+        """
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT t.video_id, t.title, t.lang, t.url, t.path, c.start_ms, snippet(cue_index, 0, '', '', '...', 16) "
+                "FROM cue_index JOIN cues c ON c.id = cue_index.rowid JOIN transcripts t ON t.id = c.transcript_id "
+                "WHERE cue_index MATCH ? ORDER BY cue_index.rowid DESC LIMIT ?",
+                (expression, limit)).fetchall()
+        keys = ('video_id', 'title', 'lang', 'url', 'path', 'start_ms', 'snippet')
+        return [dict(zip(keys, row)) for row in rows]
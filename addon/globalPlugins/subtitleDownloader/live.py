@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Incremental capture of live stream captions from HLS subtitle playlists.
+
+A live stream's subtitle track is a media playlist that keeps growing: each
+poll lists the latest WebVTT segments, overlapping the previous poll. Only
+segments with a sequence number above the last one read are fetched, and
+cues repeated across segment boundaries or rolled over from the previous
+cue are dropped before the text is appended to the file. What is kept
+between polls is the last sequence number and a small window of recent
+cues, so memory stays flat however long the stream runs. The module has no
+NVDA dependencies.
+"""
+
+import io
+import re
+import sys
+from collections import deque
+from urllib.parse import urljoin
+
+from . import converter
+
+DEFAULT_POLL_INTERVAL = 6 # Seconds, when the playlist does not give a target duration
+MAX_FAILURES = 5 # Consecutive failed polls before giving up
+RECENT_CUES = 64 # Cues remembered to recognise repeats in overlapping segments
+
+_URI_RE = re.compile(r'URI="([^"]+)"')
+
+
+def is_live_track(track):
+    """Whether a subtitle track is an HLS playlist rather than a complete file."""
+    url = track.get('url') or ''
+    return (track.get('protocol') or '').startswith('m3u8') or '.m3u8' in url.split('?', 1)[0]
+
+
+def parse_playlist(text, base_url):
+    """Parses an HLS playlist.
+
+    Returns (segments, target_duration, ended, rendition_url): segments is a
+    list of (sequence number, absolute URL). For a master playlist only
+    rendition_url, its first subtitle rendition, is set.
+    """
+    sequence = 0
+    segments = []
+    target_duration = None
+    ended = False
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-MEDIA:') and 'TYPE=SUBTITLES' in line:
+            match = _URI_RE.search(line)
+            if match:
+                return [], None, False, urljoin(base_url, match.group(1))
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            target_duration = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-ENDLIST'):
+            ended = True
+        elif not line.startswith('#'):
+            segments.append((sequence, urljoin(base_url, line)))
+            sequence += 1
+    return segments, target_duration, ended, None
+
+
+class LiveCaptionCapture(object):
+    """Polls a live subtitle playlist and appends new caption lines to a text file.
+
+    fetch(url) returns the body of a URL as bytes. wait(seconds) sleeps
+    between polls and returns True when the capture should stop (the job was
+    cancelled), like threading.Event.wait.
+    """
+
+    def __init__(self, fetch, playlist_url, out_file, wait, poll_interval=None):
+        self._fetch = fetch
+        self.playlist_url = playlist_url
+        self._out_file = out_file
+        self._wait = wait
+        self._poll_interval = poll_interval
+        self._last_sequence = -1
+        self._recent = deque()
+        self._recent_keys = set()
+        self._previous_lines = ()
+        self._last_line = None
+        self.lines = 0
+        self.bytes = 0
+
+    def run(self):
+        """Captures until the stream ends, the job is cancelled or polling keeps failing.
+
+        Returns the number of lines written.
+        """
+        failures = 0
+        while True:
+            try:
+                text = self._fetch(self.playlist_url).decode('utf-8', 'replace')
+                segments, target_duration, ended, rendition_url = parse_playlist(text, self.playlist_url)
+                if rendition_url and rendition_url != self.playlist_url:
+                    self.playlist_url = rendition_url
+                    continue
+                for sequence, segment_url in segments:
+                    if self._wait(0):
+                        return self.lines
+                    if sequence > self._last_sequence:
+                        self._read_segment(segment_url)
+                        self._last_sequence = sequence
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"SubtitleDownloader: Live caption poll failed ({failures}/{MAX_FAILURES}): {e}", file=sys.stderr)
+                if failures >= MAX_FAILURES:
+                    break
+                target_duration, ended = None, False
+            if ended:
+                break
+            # New segments appear about once per target duration
+            if self._wait(self._poll_interval or target_duration or DEFAULT_POLL_INTERVAL):
+                break
+        return self.lines
+
+    def _read_segment(self, url):
+        data = self._fetch(url)
+        self.bytes += len(data)
+        for start_ms, end_ms, text_lines in converter.iter_vtt_cues(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig')):
+            key = (start_ms, end_ms, tuple(text_lines))
+            if key in self._recent_keys:
+                continue # The same cue, repeated at a segment boundary
+            self._recent.append(key)
+            self._recent_keys.add(key)
+            if len(self._recent) > RECENT_CUES:
+                self._recent_keys.discard(self._recent.popleft())
+            # Rolling captions repeat lines of the previous cue, as in converter.iter_text
+            for text in text_lines:
+                if text == self._last_line or text in self._previous_lines:
+                    continue
+                self._last_line = text
+                self._out_file.write(text)
+                self._out_file.write('\n')
+                self.lines += 1
+            self._previous_lines = text_lines
+        # Lines reach the disk as they arrive, so a crash loses at most one segment
+        self._out_file.flush()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""Language picker that opens before the subtitle list is known.
+
+The dialog is shown as soon as a download starts, in a loading state, and
+the worker thread fills in the languages once extraction returns. It is
+modeless: the worker drives it through a LanguagePicker handle and waits
+for the answer, while NVDA's main thread stays free.
+"""
+
+import gettext
+import threading
+
+import addonHandler
+import gui
+import ui
+import wx
+from gui import guiHelper
+
+addonHandler.initTranslation()
+_ = gettext.gettext
+
+
+class LanguagePickerDialog(wx.Dialog):
+    """Single or multiple choice of subtitle languages, with a loading state.
+
+    on_done is called with the chosen languages (empty when cancelled) just
+    before the dialog destroys itself.
+    """
+
+    def __init__(self, parent, multi_select, on_done):
+        # Translators: Title of the language selection dialog
+        title = _("Select Subtitle Languages") if multi_select else _("Select Subtitle Language")
+        super(LanguagePickerDialog, self).__init__(parent, title=title)
+        self._multi_select = multi_select
+        self._on_done = on_done
+        self._languages = []
+
+        mainSizer = wx.BoxSizer(wx.VERTICAL)
+        helper = guiHelper.BoxSizerHelper(self, orientation=wx.VERTICAL)
+        # Translators: Shown in the language selection dialog while the video is being read
+        self.prompt = helper.addItem(wx.StaticText(self, label=_("Loading subtitle languages...")))
+        listClass = wx.CheckListBox if multi_select else wx.ListBox
+        # A single placeholder item, so focus lands in the list and the state is read out
+        # Translators: Placeholder item of the language list while loading
+        self.languageList = helper.addItem(listClass(self, choices=[_("Loading...")], size=(300, 200)))
+        self.languageList.SetSelection(0)
+        helper.addDialogDismissButtons(self.CreateButtonSizer(wx.OK | wx.CANCEL))
+        self.okButton = self.FindWindowById(wx.ID_OK)
+        self.okButton.Disable()
+
+        mainSizer.Add(helper.sizer, border=guiHelper.BORDER_FOR_DIALOGS, flag=wx.ALL)
+        mainSizer.Fit(self)
+        self.SetSizer(mainSizer)
+        self.CentreOnScreen()
+        self.languageList.SetFocus()
+
+        self.Bind(wx.EVT_BUTTON, self.onOk, id=wx.ID_OK)
+        self.Bind(wx.EVT_BUTTON, self.onCancel, id=wx.ID_CANCEL)
+        self.Bind(wx.EVT_CLOSE, self.onCancel)
+        if not multi_select:
+            self.languageList.Bind(wx.EVT_LISTBOX_DCLICK, self.onOk)
+
+    def set_languages(self, languages, selected=None, labels=None):
+        self._languages = list(languages)
+        self.languageList.Set([labels.get(lang, lang) for lang in self._languages] if labels else self._languages)
+        index = self._languages.index(selected) if selected in self._languages else 0
+        self.languageList.SetSelection(index)
+        if self._multi_select:
+            if selected in self._languages:
+                self.languageList.Check(index)
+            self.prompt.SetLabel(_("Multiple subtitle languages found. Please choose one or more:"))
+        else:
+            self.prompt.SetLabel(_("Multiple subtitle languages found. Please choose one:"))
+        self.okButton.Enable()
+        self.languageList.SetFocus()
+        # Translators: Announced when the language list of the picker is filled in
+        ui.message(_("{count} subtitle languages found.").format(count=len(self._languages)))
+
+    def _finish(self, result):
+        self._on_done(result)
+        self.Destroy()
+
+    def onOk(self, evt):
+        if not self._languages:
+            return # Still loading
+        if self._multi_select:
+            result = [self._languages[i] for i in self.languageList.GetCheckedItems()]
+            if not result and self.languageList.GetSelection() != wx.NOT_FOUND:
+                # Nothing ticked: take the highlighted language
+                result = [self._languages[self.languageList.GetSelection()]]
+        else:
+            result = [self._languages[self.languageList.GetSelection()]]
+        self._finish(result)
+
+    def onCancel(self, evt):
+        self._finish([])
+
+
+class LanguagePicker(object):
+    """Worker thread handle on a LanguagePickerDialog living on the main thread.
+
+    The dialog opens as soon as the handle is created. on_closed is called
+    exactly once, when the user answers or close() is called, whichever
+    comes first.
+    """
+
+    def __init__(self, multi_select, on_closed=None):
+        self.result = []
+        self._on_closed = on_closed
+        self._dialog = None
+        self._done = threading.Event()
+        self._finish_lock = threading.Lock()
+        wx.CallAfter(self._show, multi_select)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def set_languages(self, languages, selected=None, labels=None):
+        """Fills in the list; selected, if available, is highlighted (and ticked).
+
+        labels maps languages to the text shown for them, when it differs.
+        """
+        wx.CallAfter(self._set_languages, languages, selected, labels)
+
+    def wait(self, cancelled=None):
+        """Blocks until the user answers. Returns the chosen languages, empty if cancelled.
+
+        cancelled() is polled meanwhile; when it turns true the dialog is closed.
+        """
+        while not self._done.wait(0.25):
+            if cancelled and cancelled():
+                self.close()
+        return self.result
+
+    def close(self):
+        """Closes the dialog without an answer, if it is still open."""
+        if self._finish():
+            wx.CallAfter(self._destroy)
+
+    def _finish(self):
+        with self._finish_lock:
+            if self._done.is_set():
+                return False
+            self._done.set()
+        if self._on_closed:
+            self._on_closed()
+        return True
+
+    def _show(self, multi_select):
+        if self._done.is_set():
+            return # Closed before the main thread got to it
+        gui.mainFrame.prePopup()
+        self._dialog = LanguagePickerDialog(gui.mainFrame, multi_select, self._answer)
+        self._dialog.Show()
+        gui.mainFrame.postPopup()
+
+    def _set_languages(self, languages, selected, labels):
+        if self._dialog:
+            self._dialog.set_languages(languages, selected, labels)
+
+    def _answer(self, result):
+        # Called by the dialog, which destroys itself afterwards
+        self._dialog = None
+        self.result = result
+        self._finish()
+
+    def _destroy(self):
+        if self._dialog:
+            dialog, self._dialog = self._dialog, None
+            dialog.Destroy()
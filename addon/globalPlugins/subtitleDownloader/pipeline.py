@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+"""Headless download pipeline: extraction, track selection, fetch and conversion.
+
+Nothing here talks to NVDA, so the same steps the plugin runs on a hotkey
+press can be driven by benchmarks or from the command line.
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlsplit
+
+from . import converter, live
+from .cache import url_expiry
+from .cuestore import CueStore
+from .timing import TimedWriter
+from .trackcache import track_key
+
+
+# Speculative fetches kept at most, oldest dropped first
+MAX_PREFETCHED = 4
+
+# Where a language's tracks come from, best first: uploaded subtitles,
+# automatic captions in the spoken language, automatic translations of those
+MANUAL = 'manual'
+AUTOMATIC = 'automatic'
+TRANSLATED = 'translated'
+TRACK_SOURCES = (MANUAL, AUTOMATIC, TRANSLATED)
+
+# Timed exports written next to the TXT file: format -> (file suffix, CueStore writer)
+EXPORT_FORMATS = {
+    'srt': ('srt', CueStore.write_srt),
+    'timestamped': ('timed.txt', CueStore.write_timestamped_text),
+}
+
+
+@contextmanager
+def atomic_open(path, mode='w', **kwargs):
+    """Opens a temporary file next to path and moves it over path once the block succeeds.
+
+    Readers of path never see a half-written file, and a failed write
+    leaves no partial file behind. Each call gets its own temporary file,
+    so two writers of the same path cannot mix their output.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as out_file:
+            yield out_file
+        # mkstemp creates files readable by their owner only; a replaced file keeps its mode
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        elif os.name != 'nt':
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+_VTT_HEADER_END_RE = re.compile(rb'\r?\n\r?\n')
+
+
+def sanitize_filename(name):
+    return re.sub(r'[\/*?":<>|]', "_", name)
+
+
+def _is_video_entry(entry):
+    return (bool(entry) and entry.get('_type', 'url') in ('url', 'url_transparent') and bool(entry.get('url') or entry.get('webpage_url'))
+            and entry.get('ie_key') != 'YoutubeTab')
+
+
+def _is_channel_tab(entry):
+    return bool(entry) and (entry.get('_type') == 'playlist' or entry.get('ie_key') == 'YoutubeTab')
+
+
+def playlist_entries(playlist_info):
+    """Returns the videos of a flat playlist or channel, in order.
+
+    Only entries yt-dlp left unresolved with a URL are kept. A bare channel
+    URL of a channel with several tabs (Videos, Shorts, ...) comes back as
+    one nested playlist per tab; then the videos of the Videos tab (or of
+    the first tab) are returned.
+    """
+    entries = list(playlist_info.get('entries') or [])
+    tabs = [entry for entry in entries if entry and entry.get('_type') == 'playlist' and entry.get('entries')]
+    if tabs and not any(_is_video_entry(entry) for entry in entries):
+        videos_tab = next((tab for tab in tabs if (tab.get('webpage_url') or tab.get('url') or '').rstrip('/').endswith('/videos')), tabs[0])
+        entries = list(videos_tab['entries'])
+    return [entry for entry in entries if _is_video_entry(entry)]
+
+
+def has_channel_tabs(playlist_info):
+    """Whether a playlist lists channel tabs (which playlist_entries does not follow as links)."""
+    return any(_is_channel_tab(entry) for entry in playlist_info.get('entries') or [])
+
+
+def entry_base_name(index, entry):
+    """File name, without language and extension, of the index-th (from 1) video of a playlist.
+
+    Files are found again by this name when a playlist is resumed.
+    """
+    return "%03d - %s" % (index, sanitize_filename(entry.get('title') or entry.get('id') or 'video'))
+
+
+def select_track(tracks):
+    """Picks the cheapest track to fetch for a language.
+
+    A track whose body came inline with the extraction costs nothing;
+    otherwise the smallest format to transfer wins. HLS tracks, which take
+    a request per segment, are only picked when nothing else is offered.
+    """
+    supported = [t for t in tracks if t.get('ext') in converter.SUPPORTED_FORMATS and (t.get('url') or t.get('data'))]
+    if not supported:
+        return None
+    return min(supported, key=lambda t: (not t.get('data'), live.is_live_track(t), converter.SUPPORTED_FORMATS.index(t['ext'])))
+
+
+def _caption_source(track):
+    # YouTube serves translations as the original captions with a target language
+    query = dict(parse_qsl(urlsplit(track.get('url') or '').query))
+    return TRANSLATED if query.get('tlang') else AUTOMATIC
+
+
+def rank_subtitles(info_dict, sources=TRACK_SOURCES, preferences=()):
+    """Returns {lang: tracks} over the subtitles and automatic captions of an info dict.
+
+    Each language comes from the best of sources that has a convertible
+    track for it, and languages are ordered by that source, so manual
+    subtitles come first and translations last. Translations are only a
+    fallback: one is offered for each of preferences (language codes, as
+    for guess_language) that no manual or automatic track matches. Every
+    returned track is a copy carrying its 'source'. Tracks that already
+    have one (from the metadata cache) keep it.
+    """
+    candidates = {source: OrderedDict() for source in TRACK_SOURCES}
+    for lang, tracks in (info_dict.get('subtitles') or {}).items():
+        for track in tracks:
+            candidates[track.get('source', MANUAL)].setdefault(lang, []).append(track)
+    for lang, tracks in (info_dict.get('automatic_captions') or {}).items():
+        # yt-dlp names the untranslated captions 'en-orig' next to an 'en' translation
+        if lang.endswith('-orig'):
+            lang = lang[:-len('-orig')]
+        for track in tracks:
+            candidates[_caption_source(track)].setdefault(lang, []).append(track)
+
+    supported = {
+        source: OrderedDict((lang, [dict(t, source=source) for t in tracks if t.get('ext') in converter.SUPPORTED_FORMATS])
+                            for lang, tracks in candidates[source].items())
+        for source in TRACK_SOURCES
+    }
+    ranked = OrderedDict()
+    for source in sources:
+        if source == TRANSLATED:
+            continue
+        for lang, tracks in supported[source].items():
+            if lang not in ranked and tracks:
+                ranked[lang] = tracks
+    if TRANSLATED in sources:
+        # YouTube offers a hundred or more, so only the missing preferred ones are listed
+        translations = [lang for lang, tracks in supported[TRANSLATED].items() if tracks and lang not in ranked]
+        for preference in preferences:
+            if guess_language(ranked, [preference]) is None:
+                lang = guess_language(translations, [preference])
+                if lang is not None:
+                    ranked[lang] = supported[TRANSLATED][lang]
+    return ranked
+
+
+def normalize_language(code):
+    """A language code in the form guess_language compares: lower case, '-' separated."""
+    return code.lower().replace('_', '-')
+
+
+def subtitle_source(tracks):
+    """The source (MANUAL, AUTOMATIC or TRANSLATED) of a language's tracks from rank_subtitles."""
+    return tracks[0].get('source', MANUAL) if tracks else MANUAL
+
+
+def has_subtitles(info_dict):
+    """Whether a video has subtitles or captions of any kind or format."""
+    return bool(info_dict.get('subtitles') or info_dict.get('automatic_captions'))
+
+
+def guess_language(languages, preferences):
+    """Returns the language of languages that best matches the earliest preference, or None.
+
+    Codes are compared case-insensitively with '_' and '-' alike, and a
+    preference also matches another variant of the same language, so 'pt_BR'
+    finds 'pt' and 'en' finds 'en-US'.
+    """
+    normalized = {normalize_language(lang): lang for lang in languages}
+    for preference in preferences:
+        preference = normalize_language(preference)
+        if preference in normalized:
+            return normalized[preference]
+        base = preference.split('-')[0]
+        for code, lang in normalized.items():
+            if code.split('-')[0] == base:
+                return lang
+    return None
+
+
+class Pipeline(object):
+    """The steps of a subtitle download, sharing one downloader service.
+
+    downloader_factory is called once, on first use, to create the
+    downloader.DownloaderService; metadata_cache (a cache.MetadataCache),
+    library (a library.SubtitleLibrary) and track_cache (a
+    trackcache.TrackCache) are optional. sources lists the TRACK_SOURCES
+    offered, best first.
+    """
+
+    def __init__(self, downloader_factory, metadata_cache=None, library=None, track_cache=None):
+        self._downloader_factory = downloader_factory
+        self._downloader = None
+        self._downloader_lock = threading.Lock()
+        self.metadata_cache = metadata_cache
+        self.library = library
+        self.track_cache = track_cache
+        self.sources = TRACK_SOURCES
+        self._prefetched = OrderedDict() # Track URL -> Future of its bytes
+        self._prefetch_lock = threading.Lock()
+
+    @property
+    def downloader(self):
+        """The shared yt-dlp service, created on first use."""
+        with self._downloader_lock:
+            if self._downloader is None:
+                self._downloader = self._downloader_factory()
+            return self._downloader
+
+    def close(self):
+        with self._downloader_lock:
+            if self._downloader is not None:
+                self._downloader.close()
+                self._downloader = None
+        if self.library is not None:
+            self.library.close()
+
+    def extract_info(self, url, timing, deadline=None, preferences=()):
+        """Returns the info dict for a URL, from the metadata cache when possible.
+
+        Playlists come back flat: entries only carry their id, URL and title,
+        which is enough to enumerate them without resolving every video.
+        deadline (a scheduler.Deadline), here and below, bounds the time
+        spent waiting for and retrying network calls. preferences are the
+        languages available_subs will be asked for, see rank_subtitles.
+        """
+        if self.metadata_cache is not None:
+            # A recent extraction of the same video lets the dialog appear at once
+            with timing.phase('cache lookup'):
+                info_dict = self.metadata_cache.get(url)
+            # An entry ranked for fewer sources or preferences than now asked for would hide tracks
+            if info_dict is not None and self._covers(info_dict, preferences):
+                print(f"SubtitleDownloader: Metadata cache hit for {url}", file=sys.stderr)
+                return info_dict
+        with timing.phase('extraction'):
+            return self.downloader.extract_info(url, deadline)
+
+    def _covers(self, cached_info, preferences):
+        """Whether a cached entry holds every track available_subs could offer for preferences."""
+        if not set(self.sources) <= set(cached_info['subtitle_sources']):
+            return False
+        if TRANSLATED not in self.sources:
+            return True
+        cached_preferences = set(cached_info['subtitle_preferences'])
+        # A preference with a manual or automatic track never needs a translation
+        untranslated = [lang for lang, tracks in cached_info['subtitles'].items() if subtitle_source(tracks) != TRANSLATED]
+        return all(normalize_language(p) in cached_preferences or guess_language(untranslated, [p]) is not None
+                   for p in preferences)
+
+    def available_subs(self, url, info_dict, preferences=()):
+        """Returns the convertible tracks of a video, by language, and caches them.
+
+        Languages are ranked by rank_subtitles over self.sources, with
+        translations offered for preferences; all of them come from the one
+        extraction already made.
+        """
+        # Keep the track lists (with their URLs) so the final fetch does
+        # not need to extract the page a second time.
+        available_subs = rank_subtitles(info_dict, self.sources, preferences)
+        # A live stream's tracks are playlists that keep changing, not worth caching
+        if available_subs and self.metadata_cache is not None and not info_dict.get('is_live'):
+            # Only the track each language would be fetched from: with
+            # translations a YouTube video has well over a hundred languages
+            chosen = {lang: [select_track(tracks)] for lang, tracks in available_subs.items() if select_track(tracks)}
+            self.metadata_cache.put(url, info_dict, chosen, self.sources, [normalize_language(p) for p in preferences])
+        return available_subs
+
+    def forget(self, url):
+        """Drops cached metadata for a URL whose track URLs stopped working."""
+        if self.metadata_cache is not None:
+            self.metadata_cache.discard(url)
+
+    def _cache_key(self, video, lang_code, track):
+        # An HLS track is joined from segments, there is no single response to revalidate
+        if self.track_cache is None or video is None or live.is_live_track(track):
+            return None
+        source = track.get('source', MANUAL)
+        # Automatic captions must not stand in for manual subtitles added later
+        return track_key(video, lang_code if source == MANUAL else f"{lang_code}-{source}", track['ext'])
+
+    def prefetch(self, tracks, timing, video=None, lang_code=None, deadline=None):
+        """Starts fetching, in the background, the track save_language would pick from tracks.
+
+        Used while the user is still choosing: if the guess is right the
+        bytes are ready, or on their way, when save_language asks for them.
+        With video and lang_code the track cache is used, as in save_language.
+        """
+        track = select_track(tracks)
+        if not track or track.get('data'):
+            return
+        cache_key = self._cache_key(video, lang_code, track)
+        future = Future()
+        with self._prefetch_lock:
+            if track['url'] in self._prefetched:
+                return
+            self._prefetched[track['url']] = future
+            while len(self._prefetched) > MAX_PREFETCHED:
+                self._prefetched.popitem(last=False)
+
+        def run():
+            try:
+                with timing.phase('prefetch') as record:
+                    data = self._download(track, cache_key, deadline)
+                    record['bytes'] = len(data)
+                future.set_result(data)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="SubtitleDownloaderPrefetch", daemon=True).start()
+
+    def drop_prefetched(self, tracks):
+        """Forgets a speculative fetch that turned out not to be needed."""
+        with self._prefetch_lock:
+            for track in tracks:
+                self._prefetched.pop(track.get('url'), None)
+
+    def fetch_track(self, track, cache_key=None, deadline=None):
+        """Returns the raw bytes of a subtitle track using the URL from the first extraction.
+
+        With a cache_key (see trackcache.track_key) the track cache is used.
+        """
+        # Some extractors embed the subtitle body instead of a URL
+        if track.get('data'):
+            return track['data'].encode('utf-8')
+        with self._prefetch_lock:
+            future = self._prefetched.pop(track['url'], None)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                print(f"SubtitleDownloader: Prefetch failed, fetching again: {e}", file=sys.stderr)
+        return self._download(track, cache_key, deadline)
+
+    def _download(self, track, cache_key=None, deadline=None):
+        if live.is_live_track(track):
+            return self._download_segments(track, deadline)
+        # No extraction happens here, so this is a single GET for the track,
+        # over a connection kept alive from earlier requests when possible.
+        if cache_key is None:
+            return self.downloader.fetch(track['url'], track.get('http_headers'), deadline)
+
+        cache = self.track_cache
+        url = track['url']
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if (url_expiry(url) or float('inf')) <= time.time():
+                # The URL came from an old extraction; the stored one may still work
+                url = cache.usable_url(entry)
+            if url is None or cache.is_fresh(entry):
+                data = cache.read(entry)
+                if data is not None:
+                    return data
+                url = url or track['url']
+            # Ask the server whether the stored copy is still current
+            data, etag, last_modified = self.downloader.fetch_validated(url, track.get('http_headers'), entry.get('etag'), entry.get('last_modified'), deadline)
+            if data is None:
+                data = cache.read(entry)
+                if data is not None:
+                    cache.touch(cache_key)
+                    return data
+                data, etag, last_modified = self.downloader.fetch_validated(url, track.get('http_headers'), deadline=deadline)
+        else:
+            data, etag, last_modified = self.downloader.fetch_validated(url, track.get('http_headers'), deadline=deadline)
+        cache.put(cache_key, data, url, etag, last_modified)
+        return data
+
+    def _download_segments(self, track, deadline=None):
+        """Returns an HLS subtitle track of a finished video as one WebVTT body.
+
+        The body of the track URL is a playlist, so its segments are fetched
+        in order and joined, keeping only the first segment's header.
+        """
+        headers = track.get('http_headers')
+        url = track['url']
+        while True:
+            text = self.downloader.fetch(url, headers, deadline).decode('utf-8', 'replace')
+            segments, _target_duration, _ended, rendition_url = live.parse_playlist(text, url)
+            if not rendition_url or rendition_url == url:
+                break
+            url = rendition_url # A master playlist: read its subtitle rendition
+        parts = []
+        for _sequence, segment_url in segments:
+            data = self.downloader.fetch(segment_url, headers, deadline)
+            if parts:
+                # Every segment repeats the WEBVTT header block, up to the first blank line
+                data = _VTT_HEADER_END_RE.split(data, 1)[-1]
+            parts.append(data)
+        return b'\n\n'.join(parts)
+
+    def save_language(self, lang_code, tracks, base_name, folder, timing, video=None, exports=(), deadline=None):
+        """Fetches one language and writes it as base_name.lang.txt. Returns (path, converted).
+
+        If conversion fails the original track is kept next to it instead,
+        and converted is False. With a library and video (from
+        library.video_record), the converted transcript is also indexed;
+        exports names EXPORT_FORMATS to write alongside the TXT.
+        """
+        track = select_track(tracks)
+        if not track:
+            raise LookupError(f"No supported track for {lang_code}")
+
+        with timing.phase('fetch') as record:
+            subtitle_data = self.fetch_track(track, self._cache_key(video, lang_code, track), deadline)
+            record['bytes'] = len(subtitle_data)
+
+        # Convert to TXT in memory: timestamps, metadata and rolling duplicates are dropped
+        txt_path = os.path.join(folder, f"{base_name}.{lang_code}.txt")
+        try:
+            # Conversion streams into the file, so the time spent in write() is split out
+            start = time.perf_counter()
+            with atomic_open(txt_path, 'w', encoding='utf-8') as txt_file:
+                writer = TimedWriter(txt_file)
+                converter.write_text(converter.to_text(subtitle_data, track['ext']), writer)
+                converted = time.perf_counter()
+            finished = time.perf_counter()
+            timing.add('conversion', converted - start - writer.seconds, len(subtitle_data))
+            timing.add('write', writer.seconds + finished - converted, writer.chars)
+        except Exception as conv_err:
+            print(f"Conversion error ({lang_code}): {conv_err}", file=sys.stderr)
+            # Keep the original track if conversion fails
+            raw_path = os.path.join(folder, f"{base_name}.{lang_code}.{track['ext']}")
+            with atomic_open(raw_path, 'wb') as raw_file:
+                raw_file.write(subtitle_data)
+            return raw_path, False
+
+        index = self.library is not None and video is not None
+        if index or exports:
+            # A second pass, as the TXT conversion does not parse cue times
+            try:
+                with timing.phase('cues') as record:
+                    cues = CueStore.from_cues(converter.dedupe_cues(converter.iter_cues(subtitle_data, track['ext'])))
+                    record['bytes'] = len(subtitle_data)
+            except Exception as e:
+                print(f"SubtitleDownloader: Could not read cue times of {txt_path}: {e}", file=sys.stderr)
+                return txt_path, True
+            for export in exports:
+                suffix, write = EXPORT_FORMATS[export]
+                try:
+                    with timing.phase('write'):
+                        with atomic_open(os.path.join(folder, f"{base_name}.{lang_code}.{suffix}"), 'w', encoding='utf-8') as export_file:
+                            write(cues, export_file)
+                except OSError as e:
+                    print(f"SubtitleDownloader: Could not write {suffix} export of {txt_path}: {e}", file=sys.stderr)
+            if index:
+                try:
+                    with timing.phase('library'):
+                        self.library.add(video, lang_code, txt_path, cues)
+                except Exception as e:
+                    # The TXT file is what the user asked for; indexing is best effort
+                    print(f"SubtitleDownloader: Could not add {txt_path} to the library: {e}", file=sys.stderr)
+        return txt_path, True
+
+    def capture_live(self, lang_code, tracks, base_name, folder, timing, wait):
+        """Appends the live captions of one language to base_name.lang.txt until wait() says stop.
+
+        wait(seconds) sleeps between polls and returns True to stop, e.g.
+        jobs.Job.wait_cancelled. Returns (path, lines written).
+        """
+        track = next((t for t in tracks if t.get('url') and live.is_live_track(t)), None)
+        if not track:
+            raise LookupError(f"No live track for {lang_code}")
+        txt_path = os.path.join(folder, f"{base_name}.{lang_code}.txt")
+        # Appended to, so capturing the same stream again continues the file
+        with timing.phase('live capture') as record:
+            with open(txt_path, 'a', encoding='utf-8') as txt_file:
+                capture = live.LiveCaptionCapture(lambda url: self.downloader.fetch(url, track.get('http_headers')),
+                                                  track['url'], txt_file, wait)
+                lines = capture.run()
+            record['bytes'] = capture.bytes
+        return txt_path, lines
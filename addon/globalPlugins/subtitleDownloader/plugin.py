@@ -0,0 +1,860 @@
+# -*- coding: utf-8 -*-
+"""The NVDA global plugin: gestures, dialogs and spoken messages."""
+
+import time
+# Measures this add-on's share of NVDA startup, reported once the plugin is constructed
+_module_load_start = time.perf_counter()
+
+import globalPluginHandler
+import scriptHandler
+import ui
+import api
+import os
+import wx
+import threading
+import gettext
+import addonHandler
+import globalVars
+import languageHandler
+import winUser
+from logHandler import log
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import settings
+from .cache import MetadataCache
+from .downloader import DownloaderService
+from .jobs import JobCancelled, JobQueue
+from .cuestore import parse_position
+from .library import SubtitleLibrary, format_position, video_record
+from .picker import LanguagePicker
+from .pipeline import (AUTOMATIC, TRACK_SOURCES, TRANSLATED, Pipeline, atomic_open, entry_base_name, guess_language,
+                       has_channel_tabs, has_subtitles, playlist_entries, sanitize_filename, subtitle_source)
+from .scheduler import DeadlineExceeded, FetchScheduler
+from .timing import JobTiming, TimingRecorder
+from .trackcache import TrackCache
+
+# Setup localization
+addonHandler.initTranslation()
+_ = gettext.gettext
+
+# yt-dlp pulls in hundreds of extractor modules, so it is only imported on
+# the first download (or by the optional warm-up after startup). The library
+# may be bundled inside the "lib" directory of this add-on.
+yt_dlp = None
+_yt_dlp_import_failed = False
+_yt_dlp_import_lock = threading.Lock()
+
+
+def _load_yt_dlp():
+    """Imports yt-dlp on first use. Returns the module, or None if it is missing."""
+    global yt_dlp, _yt_dlp_import_failed
+    with _yt_dlp_import_lock:
+        if yt_dlp is None and not _yt_dlp_import_failed:
+            start = time.perf_counter()
+            try:
+                import yt_dlp as module
+            except ImportError as e:
+                _yt_dlp_import_failed = True
+                # The download script tells the user; a failed warm-up stays silent
+                log.error(f"SubtitleDownloader: yt-dlp library not found. Please ensure it is installed or bundled with the add-on: {e}")
+            else:
+                yt_dlp = module
+                log.info(f"SubtitleDownloader: yt-dlp imported in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return yt_dlp
+
+
+def _warm_up_yt_dlp():
+    """Imports yt-dlp in the background at low priority so the first press is fast."""
+    try:
+        import ctypes
+        THREAD_PRIORITY_LOWEST = -2
+        ctypes.windll.kernel32.SetThreadPriority(ctypes.windll.kernel32.GetCurrentThread(), THREAD_PRIORITY_LOWEST)
+    except (ImportError, AttributeError, OSError):
+        pass
+    _load_yt_dlp()
+
+
+# Seconds after startup before the optional warm-up starts, to stay out of NVDA's way
+WARM_UP_DELAY = 15
+
+# Browsers whose documents expose their URL through NVDA's object model
+_BROWSER_APPS = ("firefox", "chrome", "msedge", "brave", "opera", "vivaldi")
+# Places the document URL is looked for, cheapest first; see GlobalPlugin._url_from_*
+_URL_SOURCES = ("browser", "document", "parentDocument", "editableValue", "ancestorDocument")
+# Seconds the object model may be probed before falling back to the clipboard
+URL_DETECTION_BUDGET = 0.25
+# Number of foreground windows/tabs whose URL is remembered
+URL_CACHE_SIZE = 32
+
+
+def _cue_exports():
+    """The timed exports (pipeline.EXPORT_FORMATS) chosen in the settings."""
+    export = settings.get("cueExport")
+    return () if export == "none" else (export,)
+
+
+def _track_sources():
+    """The kinds of tracks (pipeline.TRACK_SOURCES) offered, by the fallback setting."""
+    return TRACK_SOURCES[:settings.SUBTITLE_FALLBACKS.index(settings.get("subtitleFallback")) + 1]
+
+
+def _is_web_url(url):
+    return bool(url) and (url.startswith("http://") or url.startswith("https://"))
+
+
+# Spoken names of the phases recorded by timing.JobTiming
+_PHASE_LABELS = {
+    'url detection': _("URL detection"),
+    'clipboard': _("clipboard"),
+    'cache lookup': _("cache lookup"),
+    'extraction': _("extraction"),
+    'dialog': _("language dialog"),
+    'prefetch': _("download while choosing"),
+    'fetch': _("download"),
+    'conversion': _("conversion"),
+    'write': _("file write"),
+    'cues': _("reading cue times"),
+    'library': _("library indexing"),
+    'live capture': _("live capture"),
+}
+
+# Spoken after a language whose tracks are not manual subtitles
+_SOURCE_LABELS = {
+    AUTOMATIC: _("automatic"),
+    TRANSLATED: _("automatic translation"),
+}
+
+class GlobalPlugin(globalPluginHandler.GlobalPlugin):
+    """NVDA Global Plugin to download video subtitles."""
+
+    scriptCategory = _("Subtitle Downloader")
+
+    def __init__(self):
+        super(GlobalPlugin, self).__init__()
+        settings.register()
+        self._config_dir = os.path.join(globalVars.appArgs.configPath, "subtitleDownloader")
+        self._library = SubtitleLibrary(os.path.join(self._config_dir, "library.sqlite3"))
+        self._track_cache = TrackCache(os.path.join(self._config_dir, "tracks"), max_bytes=settings.get("trackCacheSize") * 1024 * 1024)
+        # Shared by all jobs, so their requests to one site are limited together
+        self._scheduler = FetchScheduler(rate=settings.get("requestsPerSecond"))
+        # The downloader is created on the first download, once yt-dlp is imported
+        self._pipeline = Pipeline(
+            lambda: DownloaderService(yt_dlp, cache_dir=os.path.join(self._config_dir, "yt-dlp"), scheduler=self._scheduler),
+            MetadataCache(os.path.join(self._config_dir, "metadata.json")),
+            self._library,
+            self._track_cache,
+        )
+        self._pipeline.sources = _track_sources()
+        self._jobs = JobQueue(self._download_subtitle_thread, max_workers=settings.get("maxConcurrentJobs"))
+        self._timings = TimingRecorder()
+        # (window handle, window title) -> URL, and the URL source that last worked per browser
+        self._url_cache = OrderedDict()
+        self._url_sources = {}
+        # Transcript used by the jump to time script: (video id, language, title), and its loaded cues
+        self._current_transcript = None
+        self._current_cues = None
+        # Only one language dialog is shown at a time, whatever the number of workers
+        self._dialog_lock = threading.Lock()
+        self._warm_up_timer = None
+        if settings.get("preloadYtDlp"):
+            self._warm_up_timer = threading.Timer(WARM_UP_DELAY, _warm_up_yt_dlp)
+            self._warm_up_timer.daemon = True
+            self._warm_up_timer.start()
+        log.info(f"SubtitleDownloader: loaded in {(time.perf_counter() - _module_load_start) * 1000:.0f} ms")
+
+    def _get_video_url(self, timing):
+        """Tries to get the URL of the video from the foreground application."""
+        url = None
+        focusObject = None
+        try:
+            focusObject = api.getFocusObject()
+            appModule = focusObject.appModule
+            window_name = appModule.appName # Use a different variable name to avoid conflict
+
+            # Browser detection (more robust)
+            if window_name in _BROWSER_APPS:
+                # The window title changes with the tab and with most navigations,
+                # so it is part of the key; page loads also clear the window's entries.
+                foreground = api.getForegroundObject()
+                cache_key = (foreground.windowHandle, foreground.name)
+                url = self._url_cache.get(cache_key)
+                if url:
+                    self._url_cache.move_to_end(cache_key)
+                    log.debug(f"SubtitleDownloader: URL from window cache: {url}")
+                    return url
+                url = self._probe_document_url(focusObject, appModule)
+                if url:
+                    self._url_cache[cache_key] = url
+                    if len(self._url_cache) > URL_CACHE_SIZE:
+                        self._url_cache.popitem(last=False)
+                    return url
+
+            # Add logic for other applications/platforms if needed
+            # For example, for media players, the URL might be in a different property
+
+        except Exception as e:
+            # More specific error message for debugging
+            log.debug(f"SubtitleDownloader: Error getting URL from {focusObject.appModule.appName if hasattr(focusObject, 'appModule') and focusObject.appModule else 'unknown app'}: {e}")
+            # ui.message(_("Could not determine video URL.")) # User message is handled by the caller script
+        # Final fallback: check clipboard for a URL
+        with timing.phase('clipboard'):
+            clipboard_url = self._get_url_from_clipboard()
+        if clipboard_url:
+            log.debug(f"SubtitleDownloader: URL from clipboard: {clipboard_url}")
+            return clipboard_url
+        return None
+
+    def _probe_document_url(self, focusObject, appModule):
+        """Probes the object model for the document URL within URL_DETECTION_BUDGET.
+
+        Every probe can be a slow cross-process call on heavy pages, so the
+        source that worked last time in this browser is tried first, and
+        probing stops once the budget is spent.
+        """
+        deadline = time.perf_counter() + URL_DETECTION_BUDGET
+        sources = list(_URL_SOURCES)
+        preferred = self._url_sources.get(appModule.appName)
+        if preferred:
+            sources.remove(preferred)
+            sources.insert(0, preferred)
+        for source in sources:
+            if time.perf_counter() > deadline:
+                log.debug(f"SubtitleDownloader: URL detection budget spent before trying {source}")
+                break
+            try:
+                url = getattr(self, "_url_from_" + source)(focusObject, appModule, deadline)
+            except Exception as e:
+                log.debug(f"SubtitleDownloader: Error getting URL from {source}: {e}")
+                continue
+            if _is_web_url(url):
+                log.debug(f"SubtitleDownloader: URL from {source}: {url}")
+                self._url_sources[appModule.appName] = source
+                return url
+        return None
+
+    def _url_from_browser(self, focusObject, appModule, deadline):
+        # appModule.browser.url (most reliable for supported browsers)
+        if hasattr(appModule, 'browser') and hasattr(appModule.browser, 'url'):
+            return appModule.browser.url
+        return None
+
+    def _url_from_document(self, focusObject, appModule, deadline):
+        if hasattr(focusObject, 'document') and hasattr(focusObject.document, 'URL'):
+            return focusObject.document.URL
+        return None
+
+    def _url_from_parentDocument(self, focusObject, appModule, deadline):
+        parent = focusObject.simpleParent
+        if parent and hasattr(parent, 'document') and hasattr(parent.document, 'URL'):
+            return parent.document.URL
+        return None
+
+    def _url_from_editableValue(self, focusObject, appModule, deadline):
+        # Focus on an edit field with a value (e.g., URL bar)
+        if hasattr(focusObject, 'value') and focusObject.role == api.controlTypes.ROLE_EDITABLETEXT:
+            return focusObject.value
+        return None
+
+    def _url_from_ancestorDocument(self, focusObject, appModule, deadline):
+        # Iterate upwards to find a document object with URL
+        doc_obj = focusObject.simpleParent
+        # Limit upward search to prevent infinite loops in weird object hierarchies
+        for _level in range(5): # Check up to 5 levels up
+            if not doc_obj or time.perf_counter() > deadline:
+                break
+            if doc_obj.role == api.controlTypes.ROLE_DOCUMENT and hasattr(doc_obj, 'URL'):
+                url = doc_obj.URL
+                if _is_web_url(url):
+                    return url
+            doc_obj = doc_obj.simpleParent
+        return None
+
+    def event_documentLoadComplete(self, obj, nextHandler):
+        # A page (re)loaded: URLs cached for its window may be stale
+        try:
+            hwnd = winUser.getAncestor(obj.windowHandle, winUser.GA_ROOT)
+            for key in [key for key in self._url_cache if key[0] == hwnd]:
+                del self._url_cache[key]
+        except Exception:
+            self._url_cache.clear()
+        nextHandler()
+
+    def _get_url_from_clipboard(self):
+        """Returns a URL from the clipboard if one exists."""
+        try:
+            if wx.TheClipboard.Open():
+                try:
+                    data = wx.TextDataObject()
+                    if wx.TheClipboard.GetData(data):
+                        text = data.GetText()
+                        if text and (text.startswith("http://") or text.startswith("https://")):
+                            return text
+                finally:
+                    wx.TheClipboard.Close()
+        except Exception:
+            pass
+        return None
+
+    def _download_subtitle_thread(self, job):
+        """Runs one queued job on a worker thread."""
+        if not _load_yt_dlp():
+            ui.message(_("yt-dlp library is not available."))
+            return
+
+        url = job.url
+        # The picker opens at once, in a loading state, and is filled in after extraction
+        picker = self._open_picker()
+        if not picker:
+            ui.message(_("Attempting to download subtitles..."))
+        try:
+            downloads_path = str(Path.home() / "Downloads")
+            if not os.path.exists(downloads_path):
+                os.makedirs(downloads_path, exist_ok=True)
+                ui.message(_("Created Downloads folder."))
+
+            # Automatic translations are only offered for these
+            preferences = self._language_preferences()
+            info_dict = self._pipeline.extract_info(url, job.timing, self._job_deadline(job), preferences)
+            job.check_cancelled()
+            if info_dict.get('_type') == 'playlist':
+                # Languages are chosen later, from the playlist's first videos
+                if picker:
+                    picker.close()
+                self._download_playlist(job, info_dict, downloads_path)
+                return
+
+            video_title = info_dict.get('title', 'video')
+            job.title = video_title
+            # Sanitize title for filename
+            video_title = sanitize_filename(video_title)
+            available_subs = self._pipeline.available_subs(url, info_dict, preferences)
+            if not available_subs and picker:
+                # Closed before speaking, so the focus change does not cut the message
+                picker.close()
+            if not has_subtitles(info_dict):
+                ui.message(_("No subtitles found for this video."))
+                return
+            if not available_subs and not info_dict.get('subtitles') and AUTOMATIC not in self._pipeline.sources:
+                ui.message(_("This video only has automatic captions, which are turned off in the settings."))
+                return
+            if not available_subs:
+                 ui.message(_("No suitable subtitle formats found (VTT, SRV, TTML)."))
+                 return
+
+            # A live track is a playlist, not worth fetching speculatively
+            video = video_record(url, info_dict)
+            selected_langs = self._choose_languages(job, available_subs, picker, prefetch=not info_dict.get('is_live'), video=video)
+            if not selected_langs:
+                ui.message(_("Subtitle download cancelled."))
+                return
+
+            if info_dict.get('is_live'):
+                self._capture_live(job, selected_langs[0], available_subs, video_title, downloads_path)
+                return
+
+            self._finish_download(job, selected_langs, available_subs, video_title, downloads_path, video)
+
+        except JobCancelled:
+            raise
+        except DeadlineExceeded as e:
+            job.check_cancelled()
+            ui.message(_("Download timed out: the site did not respond or kept limiting requests."))
+            log.warning(f"SubtitleDownloader: {e}")
+        except yt_dlp.utils.DownloadError as e:
+            # A cancel can surface as the error of the request it interrupted
+            job.check_cancelled()
+            ui.message(_("Download Error: Could not retrieve subtitle information."))
+            log.error(f"yt-dlp error: {e}")
+        except Exception as e:
+            job.check_cancelled()
+            ui.message(_("An unexpected error occurred during download."))
+            log.error(f"Error in download thread: {e}")
+        finally:
+            if picker:
+                picker.close()
+            self._timings.record(job.timing)
+
+    def _job_deadline(self, job):
+        """A new deadline for a job's next network step, from the configured timeout.
+
+        Time spent in the language dialog is not counted: the steps after it
+        get a deadline of their own.
+        """
+        return job.deadline(settings.get("jobTimeout"))
+
+    def _open_picker(self):
+        """Opens the language picker before extraction, or returns None.
+
+        Not when configured languages make a dialog unlikely, nor while
+        another job's picker is open: that job keeps the dialog and this one
+        asks after extraction, as before.
+        """
+        if settings.get("alwaysFetchLanguages") or not self._dialog_lock.acquire(blocking=False):
+            return None
+        return LanguagePicker(settings.get("multiSelect"), self._dialog_lock.release)
+
+    def _language_preferences(self):
+        """Languages the user most likely wants: configured ones, recently downloaded ones, then NVDA's."""
+        try:
+            recent = self._library.recent_languages()
+        except Exception as e:
+            log.error(f"SubtitleDownloader: Error reading library: {e}")
+            recent = []
+        return list(settings.get("alwaysFetchLanguages")) + recent + [languageHandler.getLanguage()]
+
+    def _choose_languages(self, job, available_subs, picker=None, prefetch=False, video=None):
+        """Returns the languages to fetch, asking the user when there is a choice.
+
+        picker is an already open LanguagePicker to fill in; with prefetch,
+        the likeliest language is fetched while the user decides (through
+        the track cache when video, from library.video_record, is given).
+        """
+        languages = list(available_subs.keys())
+        # Configured languages are fetched without asking
+        selected_langs = [lang for lang in settings.get("alwaysFetchLanguages") if lang in available_subs]
+
+        if selected_langs or len(languages) == 1:
+            if picker:
+                picker.close()
+            selected_langs = selected_langs or languages
+            ui.message(_("Found subtitles in: {lang}").format(lang=", ".join(self._language_label(lang, available_subs[lang]) for lang in selected_langs)))
+        else:
+            guess = guess_language(languages, self._language_preferences())
+            if guess and prefetch:
+                self._pipeline.prefetch(available_subs[guess], job.timing, video, guess, self._job_deadline(job))
+            labels = {lang: self._language_label(lang, available_subs[lang]) for lang in languages}
+            with job.timing.phase('dialog'):
+                selected_langs = self._wait_for_languages(job, languages, guess, picker, labels)
+            if guess and prefetch and guess not in selected_langs:
+                self._pipeline.drop_prefetched(available_subs[guess])
+            job.check_cancelled()
+        return selected_langs
+
+    def _language_label(self, lang, tracks):
+        """A language code as shown and spoken, marked when its subtitles are automatic."""
+        source = _SOURCE_LABELS.get(subtitle_source(tracks))
+        return f"{lang} ({source})" if source else lang
+
+    def _download_playlist(self, job, playlist_info, downloads_path):
+        """Fetches subtitles for every video of a playlist or channel in parallel.
+
+        One TXT per video is written to a folder named after the playlist;
+        videos whose files already exist there are skipped, so running the
+        same playlist again only fetches what is missing.
+        """
+        entries = playlist_entries(playlist_info)
+        playlist_title = sanitize_filename(playlist_info.get('title') or 'playlist')
+        job.title = playlist_title
+        if not entries:
+            if has_channel_tabs(playlist_info):
+                # Translators: Spoken when a channel's home page lists only its tabs
+                ui.message(_("This channel page only lists its tabs. Open the channel's Videos tab and try again."))
+            else:
+                ui.message(_("No videos found in this playlist."))
+            return
+        ui.message(_("Playlist with {count} videos found.").format(count=len(entries)))
+
+        folder = os.path.join(downloads_path, playlist_title)
+        os.makedirs(folder, exist_ok=True)
+        base_names = [entry_base_name(index, entry) for index, entry in enumerate(entries, 1)]
+
+        lang_codes = list(settings.get("alwaysFetchLanguages"))
+        if not lang_codes:
+            # Languages are chosen once, from the first videos that have subtitles
+            preferences = self._language_preferences()
+            for entry in entries[:5]:
+                entry_url = entry.get('webpage_url') or entry['url']
+                info_dict = self._pipeline.extract_info(entry_url, job.timing, self._job_deadline(job), preferences)
+                available_subs = self._pipeline.available_subs(entry_url, info_dict, preferences)
+                job.check_cancelled()
+                if available_subs:
+                    lang_codes = self._choose_languages(job, available_subs)
+                    break
+            if not lang_codes:
+                ui.message(_("Subtitle download cancelled."))
+                return
+
+        # Videos already in the library are found by id, even if their number in the playlist changed
+        try:
+            recorded = self._library.lookup(entry['id'] for entry in entries if entry.get('id'))
+        except Exception as e:
+            log.error(f"SubtitleDownloader: Error reading library: {e}")
+            recorded = {}
+
+        def is_saved(entry, base_name, lang):
+            path = recorded.get(entry.get('id'), {}).get(lang)
+            if path and os.path.dirname(path) == folder and os.path.exists(path):
+                return True
+            # Files saved before the library existed
+            return os.path.exists(os.path.join(folder, f"{base_name}.{lang}.txt"))
+
+        pending = [(entry, base_name) for entry, base_name in zip(entries, base_names)
+                   if not all(is_saved(entry, base_name, lang) for lang in lang_codes)]
+        skipped = len(entries) - len(pending)
+        saved = 0
+        without_subs = 0
+        failed = 0
+
+        workers = max(1, min(len(pending), settings.get("playlistParallelism")))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SubtitleDownloaderPlaylist") as pool:
+            futures = [pool.submit(self._download_playlist_entry, job, entry, base_name, lang_codes, folder)
+                       for entry, base_name in pending]
+            try:
+                for future in futures:
+                    try:
+                        count = future.result()
+                        if count:
+                            saved += count
+                        else:
+                            without_subs += 1
+                    except JobCancelled:
+                        raise
+                    except Exception as e:
+                        log.error(f"Error in playlist entry: {e}")
+                        failed += 1
+            except JobCancelled:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if settings.get("playlistCombinedFile"):
+            self._combine_playlist(folder, base_names, entries, lang_codes, os.path.join(downloads_path, playlist_title))
+
+        messages = [_("Playlist finished: {saved} subtitle files saved.").format(saved=saved)]
+        if skipped:
+            messages.append(_("{count} videos already downloaded.").format(count=skipped))
+        if without_subs:
+            messages.append(_("{count} without the chosen languages.").format(count=without_subs))
+        if failed:
+            messages.append(_("{count} failed.").format(count=failed))
+        ui.message(" ".join(messages))
+
+    def _download_playlist_entry(self, job, entry, base_name, lang_codes, folder):
+        """Extracts one playlist video and saves its chosen languages. Returns the file count."""
+        job.check_cancelled()
+        entry_url = entry.get('webpage_url') or entry['url']
+        # Each video gets the full timeout, however long the playlist
+        deadline = self._job_deadline(job)
+        # The chosen languages, so a video lacking one can fall back to its translation
+        info_dict = self._pipeline.extract_info(entry_url, job.timing, deadline, lang_codes)
+        available_subs = self._pipeline.available_subs(entry_url, info_dict, lang_codes)
+        saved = 0
+        matched = set()
+        for lang in lang_codes:
+            # Another video may list the chosen language under a regional or differently cased code
+            match = guess_language(available_subs, [lang])
+            if match and match not in matched:
+                matched.add(match)
+                job.check_cancelled()
+                # Saved under the chosen code, which the resume check and the combined file look for
+                _path, converted = self._pipeline.save_language(lang, available_subs[match], base_name, folder, job.timing,
+                                                                video_record(entry_url, info_dict), _cue_exports(), deadline)
+                saved += converted
+        return saved
+
+    def _combine_playlist(self, folder, base_names, entries, lang_codes, combined_base):
+        """Concatenates the per-video TXT files of a playlist into one file per language."""
+        for lang in lang_codes:
+            parts = [(entry, os.path.join(folder, f"{base_name}.{lang}.txt")) for entry, base_name in zip(entries, base_names)]
+            parts = [(entry, path) for entry, path in parts if os.path.exists(path)]
+            if not parts:
+                continue
+            with atomic_open(f"{combined_base}.{lang}.txt", 'w', encoding='utf-8') as combined:
+                for entry, path in parts:
+                    combined.write(f"# {entry.get('title') or entry.get('id') or ''}\n")
+                    with open(path, 'r', encoding='utf-8') as part:
+                        for line in part:
+                            combined.write(line)
+                    combined.write('\n')
+
+    def _capture_live(self, job, lang_code, available_subs, video_title, downloads_path):
+        """Appends a live stream's captions to its TXT file until the stream ends or the job is cancelled.
+
+        Only one language is captured; the job keeps its worker for as long as
+        the capture runs.
+        """
+        ui.message(_("Live stream: capturing {lang} captions. Use the cancel command to stop.").format(lang=lang_code))
+        try:
+            path, lines = self._pipeline.capture_live(lang_code, available_subs[lang_code], video_title, downloads_path,
+                                                      job.timing, job.wait_cancelled)
+        except LookupError:
+            ui.message(_("This live stream has no captions that can be captured."))
+            return
+        ui.message(_("Live caption capture stopped: {lines} lines saved to {filename}.").format(lines=lines, filename=os.path.basename(path)))
+
+    def _wait_for_languages(self, job, languages, selected=None, picker=None, labels=None):
+        """Shows the languages in the picker, opening one if needed, and waits for the choice."""
+        if picker is None:
+            # Only one language dialog is open at a time; a job cancelled while waiting for it gives up
+            while not self._dialog_lock.acquire(timeout=0.25):
+                job.check_cancelled()
+            picker = LanguagePicker(settings.get("multiSelect"), self._dialog_lock.release)
+        picker.set_languages(languages, selected, labels)
+        return picker.wait(lambda: job.cancelled)
+
+    def _download_language(self, job, lang_code, tracks, video_title, downloads_path, video, deadline):
+        """Fetches and converts one language on a pool thread. Returns (path, converted)."""
+        job.check_cancelled()
+        return self._pipeline.save_language(lang_code, tracks, video_title, downloads_path, job.timing, video, _cue_exports(), deadline)
+
+    def _finish_download(self, job, lang_codes, available_subs, video_title, downloads_path, video=None):
+        """Fetches the chosen languages in parallel and converts them to TXT."""
+        url = job.url
+        ui.message(_("Downloading subtitles for language: {lang}").format(lang=", ".join(lang_codes)))
+        try:
+            saved = []
+            unconverted = []
+            failed = []
+            workers = max(1, min(len(lang_codes), settings.get("maxParallelFetches")))
+            deadline = self._job_deadline(job)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SubtitleDownloader") as pool:
+                futures = [(lang, pool.submit(self._download_language, job, lang, available_subs[lang], video_title, downloads_path, video, deadline)) for lang in lang_codes]
+                for lang, future in futures:
+                    try:
+                        path, converted = future.result()
+                        (saved if converted else unconverted).append(os.path.basename(path))
+                        # The first language saved is the one the jump to time script reads
+                        if converted and video and len(saved) == 1:
+                            self._set_current_transcript(video['id'], lang, video['title'])
+                    except JobCancelled:
+                        pass
+                    except DeadlineExceeded as e:
+                        log.warning(f"SubtitleDownloader: {lang} timed out: {e}")
+                        failed.append(lang)
+                    except (yt_dlp.utils.DownloadError, yt_dlp.networking.exceptions.RequestError) as e:
+                        log.error(f"yt-dlp final download error ({lang}): {e}")
+                        failed.append(lang)
+                        # The cached track URLs may have expired; extract again next time
+                        self._pipeline.forget(url)
+                    except Exception as e:
+                        log.error(f"Error in finish_download ({lang}): {e}")
+                        failed.append(lang)
+
+            job.check_cancelled()
+            # One spoken summary for the whole batch
+            if len(lang_codes) == 1:
+                if saved:
+                    ui.message(_("Subtitles downloaded and saved as TXT: {filename}").format(filename=saved[0]))
+                elif unconverted:
+                    ui.message(_("Error converting subtitle to TXT."))
+                    ui.message(_("Subtitle saved in its original format: {filename}").format(filename=unconverted[0]))
+                else:
+                    ui.message(_("Download Error: Could not download selected subtitle."))
+            else:
+                messages = []
+                if saved:
+                    messages.append(_("Saved {count} subtitle files as TXT.").format(count=len(saved)))
+                if unconverted:
+                    messages.append(_("{count} saved in their original format.").format(count=len(unconverted)))
+                if failed:
+                    messages.append(_("Failed: {langs}.").format(langs=", ".join(failed)))
+                ui.message(" ".join(messages))
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            job.check_cancelled()
+            ui.message(_("An unexpected error occurred during final download/conversion."))
+            log.error(f"Error in finish_download: {e}")
+
+    # --- Script Handler --- 
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Downloads subtitles for the current video"),
+        category=_("Subtitle Downloader"),
+        gesture="kb:NVDA+Shift+L"
+    )
+    def script_downloadSubtitles(self, gesture):
+        # Detection happens before the job exists; its phases are copied in below
+        detection = JobTiming("detection")
+        with detection.phase('url detection'):
+            url = self._get_video_url(detection)
+        if not url:
+            ui.message(_("Could not detect a video URL in the current context."))
+            return
+
+        # Jobs run on the worker pool so NVDA is never blocked
+        self._jobs.max_workers = settings.get("maxConcurrentJobs")
+        self._track_cache.max_bytes = settings.get("trackCacheSize") * 1024 * 1024
+        self._scheduler.rate = settings.get("requestsPerSecond")
+        self._pipeline.sources = _track_sources()
+        job, is_new = self._jobs.submit(url)
+        if is_new:
+            job.timing.extend(detection)
+        position = self._jobs.position(job)
+        running, _queued = self._jobs.snapshot()
+        if not is_new:
+            ui.message(_("Subtitle download already in progress."))
+        elif position and len(running) >= self._jobs.max_workers:
+            # Every worker is busy, so even the first job in line has to wait
+            ui.message(_("Subtitle download queued, position {position}.").format(position=position))
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Reports the subtitle downloads in progress and queued"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_reportQueueStatus(self, gesture):
+        running, queued = self._jobs.snapshot()
+        if not running and not queued:
+            ui.message(_("No subtitle downloads in progress."))
+            return
+        names = [job.title or job.url for job in running]
+        message = _("{running} running: {names}.").format(running=len(running), names=", ".join(names)) if running else ""
+        if queued:
+            message += " " + _("{queued} queued.").format(queued=len(queued))
+        ui.message(message.strip())
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Cancels all queued and running subtitle downloads"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_cancelDownloads(self, gesture):
+        count = self._jobs.cancel_all()
+        if count:
+            ui.message(_("Cancelled {count} subtitle downloads.").format(count=count))
+        else:
+            ui.message(_("No subtitle downloads in progress."))
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Reports where the time went in the last subtitle download"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_reportLastTiming(self, gesture):
+        timing = self._timings.last()
+        if not timing:
+            ui.message(_("No subtitle download has finished yet."))
+            return
+        parts = []
+        for name, (seconds, nbytes, count) in timing.totals().items():
+            part = "{phase} {seconds:.2f} s".format(phase=_PHASE_LABELS.get(name, name), seconds=seconds)
+            if count > 1:
+                part += " " + _("({count} times)").format(count=count)
+            if nbytes:
+                part += ", {kb:.0f} KB".format(kb=nbytes / 1024)
+            parts.append(part)
+        ui.message(_("Last download took {total:.2f} seconds: {phases}.").format(total=timing.duration, phases="; ".join(parts)))
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Saves timing percentiles of recent subtitle downloads to a JSON file"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_saveTimingReport(self, gesture):
+        path = os.path.join(self._config_dir, "timings.json")
+        try:
+            self._timings.dump_json(path)
+            ui.message(_("Timing report saved to {path}").format(path=path))
+        except OSError as e:
+            ui.message(_("Could not save the timing report."))
+            log.error(f"SubtitleDownloader: Error saving timing report: {e}")
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Searches the text of all downloaded subtitles"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_searchLibrary(self, gesture):
+        wx.CallAfter(self._search_library)
+
+    def _search_library(self):
+        """Runs on the main thread: asks for words and lists the cues that contain them."""
+        dialog = wx.TextEntryDialog(None, _("Search downloaded subtitles for:"), _("Search Subtitle Library"))
+        try:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            query = dialog.GetValue().strip()
+        finally:
+            dialog.Destroy()
+        if not query:
+            return
+        try:
+            results = self._library.search(query)
+        except Exception as e:
+            ui.message(_("Could not search the subtitle library."))
+            log.error(f"SubtitleDownloader: Error searching library: {e}")
+            return
+        if not results:
+            ui.message(_("No downloaded subtitles contain {query}.").format(query=query))
+            return
+        choices = ["{title} ({lang}) {position}: {text}".format(
+            title=result['title'] or result['video_id'], lang=result['lang'],
+            position=format_position(result['start_ms']), text=result['snippet']) for result in results]
+        dialog = wx.SingleChoiceDialog(None, _("{count} matches. Choose one to open its transcript:").format(count=len(results)),
+                                       _("Search Subtitle Library"), choices)
+        try:
+            if dialog.ShowModal() == wx.ID_OK:
+                result = results[dialog.GetSelection()]
+                self._set_current_transcript(result['video_id'], result['lang'], result['title'])
+                try:
+                    os.startfile(result['path'])
+                except OSError:
+                    ui.message(_("The transcript file is no longer available."))
+        finally:
+            dialog.Destroy()
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Deletes the subtitle files kept to avoid downloading them again"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_clearTrackCache(self, gesture):
+        try:
+            count, size = self._track_cache.clear()
+        except OSError as e:
+            ui.message(_("Could not clear the subtitle cache."))
+            log.error(f"SubtitleDownloader: Error clearing track cache: {e}")
+            return
+        ui.message(_("Subtitle cache cleared: {count} files, {size:.1f} MB.").format(count=count, size=size / (1024 * 1024)))
+
+    def _set_current_transcript(self, video_id, lang, title):
+        self._current_transcript = (video_id, lang, title)
+        self._current_cues = None # Loaded from the library on first use
+
+    @scriptHandler.script(
+        # Translators: Input gesture description
+        description=_("Reports what was said at a given time in the last downloaded or opened subtitle"),
+        category=_("Subtitle Downloader"),
+    )
+    def script_reportCueAtTime(self, gesture):
+        if not self._current_transcript:
+            ui.message(_("No subtitle downloaded or opened yet."))
+            return
+        wx.CallAfter(self._ask_cue_position)
+
+    def _ask_cue_position(self):
+        """Runs on the main thread: asks for a time and speaks the cue shown then."""
+        video_id, lang, title = self._current_transcript
+        dialog = wx.TextEntryDialog(None, _("Time in {title} ({lang}), e.g. 12:34 or 1:02:03:").format(title=title or video_id, lang=lang),
+                                    _("Go to Time"))
+        try:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            position = parse_position(dialog.GetValue())
+        finally:
+            dialog.Destroy()
+        if position is None:
+            ui.message(_("Invalid time."))
+            return
+        try:
+            if self._current_cues is None:
+                self._current_cues = self._library.load_cues(video_id, lang)
+        except Exception as e:
+            log.error(f"SubtitleDownloader: Error loading cues: {e}")
+        cue = self._current_cues.at(position) if self._current_cues else None
+        if cue is None:
+            ui.message(_("Nothing was said before {position}.").format(position=format_position(position)))
+            return
+        ui.message("{position}: {text}".format(position=format_position(cue[0]), text=cue[2]))
+
+    def terminate(self):
+        if self._warm_up_timer:
+            self._warm_up_timer.cancel()
+        self._jobs.shutdown()
+        self._pipeline.close()
+        settings.unregister()
+
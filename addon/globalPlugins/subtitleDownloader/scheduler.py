@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Scheduling of network calls: per-host limits, rate limiting and retries.
+
+Every extraction and track fetch goes through FetchScheduler.call. For each
+host it keeps a bounded number of calls in flight and spends one token of a
+token bucket per call, so a batch of downloads settles at the rate the site
+tolerates instead of bursting into HTTP 429. Transient failures are retried
+with exponential backoff and full jitter; a Retry-After from the server
+pauses the whole host for that long. A Deadline bounds how long a job may
+wait and retry in total. The module has no NVDA dependencies.
+"""
+
+import random
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+DEFAULT_PER_HOST = 4
+DEFAULT_RATE = 5.0 # Calls per second and host
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a job's deadline passes while it waits for or retries a network call."""
+
+
+def parse_retry_after(value):
+    """Returns the seconds asked for by a Retry-After header (delay or HTTP date), or 0."""
+    if not value:
+        return 0
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class Deadline(object):
+    """A time limit for a job's network work.
+
+    cancel_event (a threading.Event, e.g. the job's) makes waits return
+    early when the job is cancelled.
+    """
+
+    def __init__(self, seconds, cancel_event=None):
+        self._end = time.monotonic() + seconds
+        self._cancel_event = cancel_event
+
+    def remaining(self):
+        return max(0.0, self._end - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def wait(self, seconds):
+        """Sleeps up to seconds, never past the deadline. Returns True if the job was cancelled."""
+        seconds = min(seconds, self.remaining())
+        if self._cancel_event is not None:
+            return self._cancel_event.wait(seconds)
+        time.sleep(seconds)
+        return False
+
+
+class _Host(object):
+    """Concurrency slots and token bucket of one host."""
+
+    def __init__(self, per_host):
+        self.slots = threading.BoundedSemaphore(per_host)
+        self.lock = threading.Lock()
+        self.tokens = None # Full on first use
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0
+
+
+class FetchScheduler(object):
+    """Runs network calls under per-host concurrency and rate limits, retrying transient errors."""
+
+    def __init__(self, per_host=DEFAULT_PER_HOST, rate=DEFAULT_RATE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.per_host = per_host
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def call(self, url, func, retry_after, deadline=None):
+        """Returns func(), a network call to url, once the host allows it; retries transient failures.
+
+        retry_after(exception) decides what is transient: it returns the delay
+        the server asked for (0 if none) to retry, or None to give up at once.
+        """
+        host = self._host(urlsplit(url).hostname or '')
+        attempt = 0
+        while True:
+            self._acquire(host, deadline)
+            try:
+                return func()
+            except Exception as e:
+                attempt += 1
+                delay_asked = retry_after(e)
+                if delay_asked is None or attempt >= self.max_attempts:
+                    raise
+                error = e
+            finally:
+                # Released before any backoff, so other calls to the host are not held up
+                host.slots.release()
+            if delay_asked:
+                # The server asked everyone to back off, not just this call
+                with host.lock:
+                    host.paused_until = max(host.paused_until, time.monotonic() + delay_asked)
+            # Full jitter: spreads out retries of calls that failed together
+            delay = max(delay_asked, random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)))
+            print(f"SubtitleDownloader: Retrying {url} in {delay:.1f} s (attempt {attempt + 1}): {error}", file=sys.stderr)
+            if deadline is not None:
+                if deadline.remaining() < delay:
+                    raise DeadlineExceeded(f"No time left to retry {url}") from error
+                if deadline.wait(delay):
+                    raise DeadlineExceeded(f"Cancelled while waiting to retry {url}") from error
+            else:
+                time.sleep(delay)
+
+    def _host(self, name):
+        with self._lock:
+            host = self._hosts.get(name)
+            if host is None:
+                host = self._hosts[name] = _Host(self.per_host)
+            return host
+
+    def _acquire(self, host, deadline):
+        """Takes a concurrency slot and a token for host, waiting as needed."""
+        if not host.slots.acquire(timeout=deadline.remaining() if deadline is not None else None):
+            raise DeadlineExceeded("Timed out waiting for a connection slot")
+        try:
+            while True:
+                with host.lock:
+                    now = time.monotonic()
+                    burst = max(1.0, self.rate * 2)
+                    if host.tokens is None:
+                        host.tokens = burst
+                    host.tokens = min(burst, host.tokens + (now - host.refilled) * self.rate)
+                    host.refilled = now
+                    if now >= host.paused_until and host.tokens >= 1:
+                        host.tokens -= 1
+                        return
+                    wait = max(host.paused_until - now, (1 - host.tokens) / self.rate)
+                if deadline is not None:
+                    if deadline.remaining() < wait:
+                        raise DeadlineExceeded("Timed out waiting for the rate limit")
+                    if deadline.wait(wait):
+                        raise DeadlineExceeded("Cancelled while waiting for the rate limit")
+                else:
+                    time.sleep(wait)
+        except BaseException:
+            host.slots.release()
+            raise
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Configuration spec and NVDA settings panel for the add-on."""
+
+import gettext
+
+import addonHandler
+import config
+import gui
+import wx
+from gui import guiHelper
+
+addonHandler.initTranslation()
+_ = gettext.gettext
+
+CONFIG_SECTION = "subtitleDownloader"
+
+confspec = {
+    # Show a multi-select list instead of a single choice when several languages exist
+    "multiSelect": "boolean(default=False)",
+    # Language codes fetched without asking whenever the video has them
+    "alwaysFetchLanguages": "string_list(default=list())",
+    # Upper bound for tracks fetched and converted at the same time
+    "maxParallelFetches": "integer(default=4, min=1, max=16)",
+    # Videos processed at the same time by the download queue
+    "maxConcurrentJobs": "integer(default=2, min=1, max=8)",
+    # Playlist videos processed at the same time
+    "playlistParallelism": "integer(default=3, min=1, max=16)",
+    # Also join a playlist's transcripts into one file per language
+    "playlistCombinedFile": "boolean(default=False)",
+    # Import yt-dlp in the background shortly after NVDA starts
+    "preloadYtDlp": "boolean(default=False)",
+    # Megabytes of raw subtitle tracks kept to avoid fetching them again
+    "trackCacheSize": "integer(default=50, min=1, max=2000)",
+    # Seconds a download may spend waiting for and retrying network requests
+    "jobTimeout": "integer(default=300, min=30, max=3600)",
+    # Requests per second sent to one site, across all downloads
+    "requestsPerSecond": "integer(default=5, min=1, max=50)",
+    # Fallbacks after manual subtitles: none, automatic captions, or those and their automatic translations
+    "subtitleFallback": 'option("none", "automatic", "translated", default="translated")',
+    # Timed copy written next to each TXT: none, srt or timestamped (see pipeline.EXPORT_FORMATS)
+    "cueExport": 'option("none", "srt", "timestamped", default="none")',
+}
+
+# Values of cueExport, in the order of the settings panel choices
+CUE_EXPORTS = ("none", "srt", "timestamped")
+# Values of subtitleFallback, in the order of the settings panel choices
+SUBTITLE_FALLBACKS = ("none", "automatic", "translated")
+
+
+def register():
+    config.conf.spec[CONFIG_SECTION] = confspec
+    gui.settingsDialogs.NVDASettingsDialog.categoryClasses.append(SubtitleDownloaderSettingsPanel)
+
+
+def unregister():
+    try:
+        gui.settingsDialogs.NVDASettingsDialog.categoryClasses.remove(SubtitleDownloaderSettingsPanel)
+    except ValueError:
+        pass
+
+
+def get(key):
+    return config.conf[CONFIG_SECTION][key]
+
+
+class SubtitleDownloaderSettingsPanel(gui.settingsDialogs.SettingsPanel):
+    # Translators: Title of the add-on settings panel
+    title = _("Subtitle Downloader")
+
+    def makeSettings(self, settingsSizer):
+        helper = guiHelper.BoxSizerHelper(self, sizer=settingsSizer)
+        section = config.conf[CONFIG_SECTION]
+
+        # Translators: Label of a checkbox in the settings panel
+        self.multiSelectCheckBox = helper.addItem(wx.CheckBox(self, label=_("Allow choosing &several languages at once")))
+        self.multiSelectCheckBox.SetValue(section["multiSelect"])
+
+        # Translators: Label of an edit field in the settings panel
+        self.alwaysFetchEdit = helper.addLabeledControl(_("&Always fetch these languages (comma separated codes, e.g. en, pt-BR):"), wx.TextCtrl)
+        self.alwaysFetchEdit.SetValue(", ".join(section["alwaysFetchLanguages"]))
+
+        # Translators: Label of a spin control in the settings panel
+        self.maxParallelSpin = helper.addLabeledControl(_("Maximum &parallel subtitle downloads:"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=1, max=16, initial=section["maxParallelFetches"])
+
+        # Translators: Label of a spin control in the settings panel
+        self.maxJobsSpin = helper.addLabeledControl(_("Maximum videos processed at the &same time:"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=1, max=8, initial=section["maxConcurrentJobs"])
+
+        # Translators: Label of a spin control in the settings panel
+        self.playlistParallelismSpin = helper.addLabeledControl(_("Playlist &videos downloaded at the same time:"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=1, max=16, initial=section["playlistParallelism"])
+
+        # Translators: Label of a checkbox in the settings panel
+        self.playlistCombinedCheckBox = helper.addItem(wx.CheckBox(self, label=_("Also save a playlist as a single &combined file")))
+        self.playlistCombinedCheckBox.SetValue(section["playlistCombinedFile"])
+
+        # Translators: Label of a checkbox in the settings panel
+        self.preloadCheckBox = helper.addItem(wx.CheckBox(self, label=_("&Load the download library in the background after NVDA starts")))
+        self.preloadCheckBox.SetValue(section["preloadYtDlp"])
+
+        # Translators: Label of a spin control in the settings panel
+        self.trackCacheSpin = helper.addLabeledControl(_("Subtitle cache si&ze (MB):"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=1, max=2000, initial=section["trackCacheSize"])
+
+        # Translators: Label of a spin control in the settings panel
+        self.requestsPerSecondSpin = helper.addLabeledControl(_("&Requests per second to a site:"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=1, max=50, initial=section["requestsPerSecond"])
+
+        # Translators: Label of a spin control in the settings panel
+        self.jobTimeoutSpin = helper.addLabeledControl(_("Give up a &download after (seconds):"), gui.nvdaControls.SelectOnFocusSpinCtrl, min=30, max=3600, initial=section["jobTimeout"])
+
+        fallbackChoices = [
+            # Translators: A choice of the subtitle fallback setting
+            _("Only subtitles added by the author"),
+            # Translators: A choice of the subtitle fallback setting
+            _("Also automatic captions"),
+            # Translators: A choice of the subtitle fallback setting
+            _("Also automatic captions and their automatic translations"),
+        ]
+        # Translators: Label of a choice in the settings panel
+        self.fallbackChoice = helper.addLabeledControl(_("Subtitles &offered:"), wx.Choice, choices=fallbackChoices)
+        self.fallbackChoice.SetSelection(SUBTITLE_FALLBACKS.index(section["subtitleFallback"]))
+
+        cueExportChoices = [
+            # Translators: A choice of the timed export setting
+            _("None"),
+            # Translators: A choice of the timed export setting
+            _("SRT subtitles"),
+            # Translators: A choice of the timed export setting
+            _("Text with timestamps"),
+        ]
+        # Translators: Label of a choice in the settings panel
+        self.cueExportChoice = helper.addLabeledControl(_("Also save subtitles with &times as:"), wx.Choice, choices=cueExportChoices)
+        self.cueExportChoice.SetSelection(CUE_EXPORTS.index(section["cueExport"]))
+
+    def onSave(self):
+        section = config.conf[CONFIG_SECTION]
+        section["multiSelect"] = self.multiSelectCheckBox.GetValue()
+        section["alwaysFetchLanguages"] = [lang.strip() for lang in self.alwaysFetchEdit.GetValue().split(",") if lang.strip()]
+        section["maxParallelFetches"] = self.maxParallelSpin.GetValue()
+        section["maxConcurrentJobs"] = self.maxJobsSpin.GetValue()
+        section["playlistParallelism"] = self.playlistParallelismSpin.GetValue()
+        section["playlistCombinedFile"] = self.playlistCombinedCheckBox.GetValue()
+        section["preloadYtDlp"] = self.preloadCheckBox.GetValue()
+        section["trackCacheSize"] = self.trackCacheSpin.GetValue()
+        section["requestsPerSecond"] = self.requestsPerSecondSpin.GetValue()
+        section["jobTimeout"] = self.jobTimeoutSpin.GetValue()
+        section["subtitleFallback"] = SUBTITLE_FALLBACKS[self.fallbackChoice.GetSelection()]
+        section["cueExport"] = CUE_EXPORTS[self.cueExportChoice.GetSelection()]
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Lightweight timing of the phases of a download job.
+
+Each job records how long every phase took (URL detection, extraction,
+dialog wait, track fetch, conversion, file write) and how many bytes it
+moved. Finished jobs are kept in a small ring buffer, from which the last
+job's breakdown and per-phase percentiles can be reported.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+DEFAULT_HISTORY = 100
+
+
+class JobTiming(object):
+    """Phase durations and byte counts for one job. Safe to fill from several threads."""
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.finished = None
+        self._phases = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, nbytes=0):
+        with self._lock:
+            self._phases.append((name, seconds, nbytes))
+
+    def extend(self, other):
+        """Copies the phases of another timing, e.g. the detection done before the job existed."""
+        self.started = min(self.started, other.started)
+        for phase in other.phases:
+            self.add(*phase)
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed block. Set record['bytes'] inside it to count bytes."""
+        record = {'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add(name, time.perf_counter() - start, record['bytes'])
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.time()
+
+    @property
+    def duration(self):
+        """Wall-clock seconds from creation to finish (or now)."""
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def phases(self):
+        with self._lock:
+            return list(self._phases)
+
+    def totals(self):
+        """Returns {name: (seconds, bytes, count)} in order of first appearance."""
+        totals = OrderedDict()
+        for name, seconds, nbytes in self.phases:
+            total_seconds, total_bytes, count = totals.get(name, (0.0, 0, 0))
+            totals[name] = (total_seconds + seconds, total_bytes + nbytes, count + 1)
+        return totals
+
+    def as_dict(self):
+        return {
+            'label': self.label,
+            'started': self.started,
+            'duration': self.duration,
+            'phases': [{'name': name, 'seconds': seconds, 'bytes': nbytes} for name, seconds, nbytes in self.phases],
+        }
+
+
+class TimedWriter(object):
+    """Wraps a text file to measure the time and characters spent writing to it.
+
+    Lets a streaming conversion report conversion and file write separately
+    without first collecting the converted text in memory.
+    """
+
+    def __init__(self, out_file):
+        self._file = out_file
+        self.seconds = 0.0
+        self.chars = 0
+
+    def write(self, text):
+        start = time.perf_counter()
+        self._file.write(text)
+        self.seconds += time.perf_counter() - start
+        self.chars += len(text)
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class TimingRecorder(object):
+    """Ring buffer of the most recent finished jobs."""
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self._jobs = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def record(self, job_timing):
+        job_timing.finish()
+        with self._lock:
+            self._jobs.append(job_timing)
+
+    def last(self):
+        with self._lock:
+            return self._jobs[-1] if self._jobs else None
+
+    def percentiles(self):
+        """Returns {phase: {count, p50, p90, p99, max}} in seconds, over the buffered jobs.
+
+        Phases repeated within a job (one fetch per language) are summed, so
+        the numbers describe what a job spent on each phase.
+        """
+        with self._lock:
+            jobs = list(self._jobs)
+        samples = OrderedDict()
+        if jobs:
+            samples['total'] = [job.duration for job in jobs]
+        for job in jobs:
+            for name, (seconds, _nbytes, _count) in job.totals().items():
+                samples.setdefault(name, []).append(seconds)
+        report = OrderedDict()
+        for name, values in samples.items():
+            values.sort()
+            report[name] = {
+                'count': len(values),
+                'p50': _percentile(values, 0.5),
+                'p90': _percentile(values, 0.9),
+                'p99': _percentile(values, 0.99),
+                'max': values[-1],
+            }
+        return report
+
+    def dump_json(self, path):
+        """Writes the percentiles and the buffered jobs to a JSON file."""
+        with self._lock:
+            jobs = [job.as_dict() for job in self._jobs]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump({'percentiles': self.percentiles(), 'jobs': jobs}, report_file, indent=2)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of raw subtitle tracks, revalidated with conditional requests.
+
+Entries are keyed by extractor, video id, language and format, and point to
+a blob named after the SHA-256 of its content, so identical payloads are
+stored once. Each entry keeps the ETag and Last-Modified the server sent
+and the expiry of the signed URL it came from: a recent entry is served
+from disk, an older one is revalidated with If-None-Match/If-Modified-Since,
+and when the only URL at hand has expired the stored copy is used as is.
+The blobs are capped in total size and evicted least recently used first.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import url_expiry
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_FRESH_FOR = 24 * 60 * 60 # Served without asking the server for this long
+
+
+def track_key(video, lang_code, ext):
+    """Returns the cache key of a track, video coming from library.video_record."""
+    return f"{video['extractor']}:{video['id']}:{lang_code}:{ext}"
+
+
+class TrackCache(object):
+    """Thread-safe, size-capped LRU store of subtitle payloads with their validators."""
+
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_BYTES, fresh_for=DEFAULT_FRESH_FOR):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self._index_path = os.path.join(folder, "index.json")
+        self._entries = None # Loaded lazily on first use
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns a copy of the entry for a key, or None.
+
+        Entries have sha256, size, url, url_expires, etag, last_modified and
+        validated (when the server last confirmed the content). Looking an
+        entry up makes it the most recently used.
+        """
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            if next(reversed(entries)) != key:
+                entries.move_to_end(key)
+                self._save()
+            return dict(entry)
+
+    def is_fresh(self, entry):
+        return time.time() - entry['validated'] < self.fresh_for
+
+    def usable_url(self, entry):
+        """The entry's own URL if it has not expired yet, else None."""
+        expires = entry.get('url_expires')
+        return entry.get('url') if expires is None or expires > time.time() else None
+
+    def read(self, entry):
+        """Returns the stored payload of an entry, or None if the blob is gone."""
+        try:
+            with open(self._blob_path(entry['sha256']), 'rb') as blob:
+                data = blob.read()
+        except OSError:
+            return None
+        return data if len(data) == entry['size'] else None
+
+    def put(self, key, data, url, etag=None, last_modified=None):
+        """Stores a payload fetched from url, evicting the least recently used entries over the cap."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        entry = {
+            'sha256': sha256,
+            'size': len(data),
+            'url': url,
+            'url_expires': url_expiry(url),
+            'etag': etag,
+            'last_modified': last_modified,
+            'validated': time.time(),
+        }
+        with self._lock:
+            entries = self._load()
+            try:
+                self._write_blob(sha256, data)
+            except OSError as e:
+                print(f"SubtitleDownloader: Could not store track in cache: {e}", file=sys.stderr)
+                return
+            replaced = entries.pop(key, None)
+            entries[key] = entry
+            if replaced is not None:
+                self._remove_unreferenced(replaced['sha256'])
+            self._evict()
+            self._save()
+
+    def touch(self, key):
+        """Marks an entry as just revalidated (the server answered 304)."""
+        with self._lock:
+            entries = self._load()
+            if key in entries:
+                entries[key]['validated'] = time.time()
+                entries.move_to_end(key)
+                self._save()
+
+    def clear(self):
+        """Deletes every stored track. Returns (entries, bytes) removed."""
+        with self._lock:
+            entries = self._load()
+            count, size = len(entries), self._total_bytes()
+            for sha256 in {entry['sha256'] for entry in entries.values()}:
+                self._remove_blob(sha256)
+            entries.clear()
+            self._save()
+        return count, size
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.folder, sha256[:2], sha256)
+
+    def _write_blob(self, sha256, data):
+        path = self._blob_path(sha256)
+        if os.path.exists(path):
+            return # Same content, already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as blob:
+            blob.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove_blob(self, sha256):
+        try:
+            os.remove(self._blob_path(sha256))
+        except OSError:
+            pass
+
+    def _remove_unreferenced(self, sha256):
+        if not any(entry['sha256'] == sha256 for entry in self._entries.values()):
+            self._remove_blob(sha256)
+
+    def _total_bytes(self):
+        # Blobs shared by several entries count once
+        return sum({entry['sha256']: entry['size'] for entry in self._entries.values()}.values())
+
+    def _evict(self):
+        while len(self._entries) > 1 and self._total_bytes() > self.max_bytes:
+            _key, entry = self._entries.popitem(last=False)
+            self._remove_unreferenced(entry['sha256'])
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self._index_path, 'r', encoding='utf-8') as index_file:
+                    # Stored oldest first, so the LRU order survives a restart
+                    for key, entry in json.load(index_file):
+                        self._entries[key] = entry
+            except (OSError, ValueError, TypeError) as e:
+                if not isinstance(e, FileNotFoundError):
+                    print(f"SubtitleDownloader: Ignoring unreadable track cache index: {e}", file=sys.stderr)
+        return self._entries
+
+    def _save(self):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            tmp_path = self._index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as index_file:
+                json.dump(list(self._entries.items()), index_file)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            print(f"SubtitleDownloader: Could not save track cache index: {e}", file=sys.stderr)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""End-to-end benchmark of the download pipeline against a local stand-in video site.
+
+Fixture pages and subtitle tracks (VTT, srv3, TTML; 1 KB to 50 MB) are
+served from a local HTTP server. Each page is a plain HTML5 <video> with a
+<track>, which yt-dlp's generic extractor understands, so the whole
+extraction -> fetch -> conversion -> write path runs without touching the
+network. Every case runs in its own process so its peak RSS is its own.
+
+Without yt-dlp installed only conversion is measured, from the same files.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 1K,1M,50M] [--formats vtt,srv3,ttml]
+                                           [--json results.json] [--baseline old.json]
+"""
+
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "addon", "globalPlugins"))
+
+DEFAULT_SIZES = "1K,100K,1M,10M,50M"
+DEFAULT_FORMATS = "vtt,srv3,ttml"
+_UNITS = {"K": 1024, "M": 1024 * 1024}
+_WORDS = ("the quick brown fox jumps over a lazy dog while we talk about "
+          "subtitles and screen readers in this long lecture").split()
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(float(text[:-1]) * _UNITS[text[-1]])
+    return int(text)
+
+
+def _cue_texts():
+    n = 0
+    while True:
+        yield " ".join(_WORDS[(n + i) % len(_WORDS)] for i in range(7))
+        n += 1
+
+
+def _ts(ms):
+    return "%02d:%02d:%02d.%03d" % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, ms % 1000)
+
+
+def write_fixture(path, fmt, target_bytes):
+    """Writes a subtitle track of roughly target_bytes in the given format."""
+    head, cue, tail = {
+        "vtt": ("WEBVTT\n\n", "{start} --> {end}\n{text}\n\n", ""),
+        "srv3": ('<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>\n',
+                 '<p t="{t}" d="2000"><s>{text}</s></p>\n', "</body></timedtext>\n"),
+        "ttml": ('<?xml version="1.0" encoding="utf-8" ?><tt xmlns="http://www.w3.org/ns/ttml"><body><div>\n',
+                 '<p begin="{start}" end="{end}">{text}</p>\n', "</div></body></tt>\n"),
+    }[fmt]
+    written = 0
+    ms = 0
+    texts = _cue_texts()
+    with open(path, "w", encoding="utf-8") as out:
+        written += out.write(head)
+        while written < target_bytes:
+            written += out.write(cue.format(start=_ts(ms), end=_ts(ms + 2000), t=ms, text=next(texts)))
+            ms += 2000
+        out.write(tail)
+
+
+def build_site(root, formats, sizes):
+    """Creates fixture pages and tracks under root. Returns [(case name, format, bytes)]."""
+    os.makedirs(os.path.join(root, "video"))
+    os.makedirs(os.path.join(root, "subs"))
+    with open(os.path.join(root, "clip.mp4"), "wb") as clip:
+        clip.write(b"\0" * 1024)
+    cases = []
+    for fmt in formats:
+        for size in sizes:
+            name = f"{fmt}-{size}"
+            track = os.path.join(root, "subs", f"{name}.{fmt}")
+            write_fixture(track, fmt, size)
+            with open(os.path.join(root, "video", f"{name}.html"), "w", encoding="utf-8") as page:
+                page.write(f'<!DOCTYPE html><html><head><title>{name}</title></head><body>'
+                           f'<video src="/clip.mp4"><track kind="subtitles" srclang="en" src="/subs/{name}.{fmt}"></video>'
+                           f'</body></html>')
+            cases.append((name, fmt, os.path.getsize(track)))
+    return cases
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(root):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process, in KB."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: PeakWorkingSetSize from GetProcessMemoryInfo
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize // 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_case(args):
+    """Runs one case in this (child) process and prints its result as JSON."""
+    from subtitleDownloader import converter
+    from subtitleDownloader.pipeline import Pipeline
+    from subtitleDownloader.timing import JobTiming
+
+    timing = JobTiming(args.case_url or args.case_file)
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        if args.case_url:
+            import yt_dlp
+            from subtitleDownloader.downloader import DownloaderService
+            pipeline = Pipeline(lambda: DownloaderService(yt_dlp))
+            try:
+                info_dict = pipeline.extract_info(args.case_url, timing)
+                available_subs = pipeline.available_subs(args.case_url, info_dict)
+                pipeline.save_language("en", available_subs["en"], "bench", out_dir, timing)
+            finally:
+                pipeline.close()
+        else:
+            # Conversion only, from the fixture file
+            with timing.phase("read") as record:
+                with open(args.case_file, "rb") as track:
+                    data = track.read()
+                record["bytes"] = len(data)
+            fmt = os.path.splitext(args.case_file)[1][1:]
+            with timing.phase("conversion") as record:
+                with open(os.path.join(out_dir, "bench.en.txt"), "w", encoding="utf-8") as out:
+                    converter.write_text(converter.to_text(data, fmt), out)
+                record["bytes"] = len(data)
+        elapsed = time.perf_counter() - start
+
+    phases = {name: {"seconds": round(seconds, 4), "bytes": nbytes} for name, (seconds, nbytes, _count) in timing.totals().items()}
+    conversion = timing.totals().get("conversion")
+    json.dump({
+        "end_to_end_seconds": round(elapsed, 4),
+        "phases": phases,
+        "conversion_mb_per_second": round(conversion[1] / conversion[0] / 1e6, 2) if conversion and conversion[0] else None,
+        "peak_rss_kb": peak_rss_kb(),
+    }, sys.stdout)
+
+
+def compare(results, baseline_path):
+    """Prints end-to-end time of each case relative to a previous run."""
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = {case["name"]: case for case in json.load(baseline_file)["cases"]}
+    for case in results["cases"]:
+        old = baseline.get(case["name"])
+        if old and old.get("end_to_end_seconds") and case.get("end_to_end_seconds"):
+            ratio = case["end_to_end_seconds"] / old["end_to_end_seconds"]
+            print(f"{case['name']}: {ratio:.2f}x baseline end-to-end time", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated track sizes, e.g. 1K,1M,50M")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help="comma separated formats among vtt, srv3, ttml")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--case-url", help=argparse.SUPPRESS)
+    parser.add_argument("--case-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case_url or args.case_file:
+        run_case(args)
+        return
+
+    try:
+        import yt_dlp
+        yt_dlp_version = yt_dlp.version.__version__
+    except ImportError:
+        yt_dlp_version = None
+        print("yt-dlp is not installed: measuring conversion only.", file=sys.stderr)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    results = {"yt_dlp": yt_dlp_version, "python": sys.version.split()[0], "cases": []}
+    with tempfile.TemporaryDirectory() as root:
+        cases = build_site(root, formats, sizes)
+        server = start_server(root)
+        base_url = "http://127.0.0.1:%d" % server.server_address[1]
+        try:
+            for name, fmt, size in cases:
+                if yt_dlp_version:
+                    case_args = ["--case-url", f"{base_url}/video/{name}.html"]
+                else:
+                    case_args = ["--case-file", os.path.join(root, "subs", f"{name}.{fmt}")]
+                output = subprocess.run([sys.executable, os.path.abspath(__file__)] + case_args,
+                                        check=True, capture_output=True, text=True).stdout
+                case = {"name": name, "format": fmt, "track_bytes": size}
+                case.update(json.loads(output))
+                results["cases"].append(case)
+                print(f"{name}: {case['end_to_end_seconds']} s, conversion {case['conversion_mb_per_second']} MB/s, "
+                      f"peak RSS {case['peak_rss_kb']} KB", file=sys.stderr)
+        finally:
+            server.shutdown()
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(results, out, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()